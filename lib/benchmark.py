@@ -0,0 +1,457 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: lib
+# File: benchmark.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+"""
+    Benchmark of the comparison pipeline (lib/post_text_compare.py, lib/html_tools.py)
+    over synthetic blog that is served by local http.server
+"""
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from time import perf_counter
+from urllib.parse import urlparse, parse_qs
+
+import lxml.html
+
+from lib.grabber import ContentSelector
+from lib.html_tools import DiffContent
+from lib.post_text_compare import PostTextsComparer, TextsLinksProvider, PagerProvider, BodyTextSelector, \
+    TextLinksGrabber
+from lib.post_text_link_checker import TextLinkSelector
+from lib.ssl_provider import GetResponse
+
+
+class SyntheticBlog:
+    """
+        It generates 'posts' texts of 'size' words. Source files are written into 'files_dir',
+        texts on the site are same texts where each word is replaced with probability 'mutation_rate'.
+
+        Markup of the site copies the markup that is expected by
+        TextsLinksProvider, PagerProvider and BodyTextSelector (lib/post_text_compare.py)
+            /?page=N - page of pager with 'per_page' posts
+            /entry/I/?page=N&text=1 - text of post
+    """
+
+    posts = 100
+
+    size = 1000
+
+    mutation_rate = 0.01
+
+    per_page = 10
+
+    words_per_paragraph = 60
+
+    vocabulary_size = 5000
+
+    def __init__(self, files_dir, posts=None, size=None, mutation_rate=None, per_page=None, seed=0) -> None:
+        for name, value in (('posts', posts), ('size', size), ('mutation_rate', mutation_rate),
+                            ('per_page', per_page)):
+            if value is not None:
+                setattr(self, name, value)
+        self.files_dir = files_dir
+        self.random = random.Random(seed)
+        self.vocabulary = ['w{}'.format(i) for i in range(self.vocabulary_size)]
+        self.texts = {}
+        self.site_texts = {}
+        super().__init__()
+
+    @property
+    def pages(self):
+        return (self.posts + self.per_page - 1) // self.per_page
+
+    def _paragraphs(self, words):
+        step = self.words_per_paragraph
+        return ''.join('<p>{}</p>'.format(' '.join(words[i:i + step])) for i in range(0, len(words), step))
+
+    def _mutate(self, words):
+        return [self.random.choice(self.vocabulary) if self.random.random() < self.mutation_rate else w
+                for w in words]
+
+    def generate(self):
+        os.makedirs(self.files_dir, exist_ok=True)
+        for i in range(1, self.posts + 1):
+            words = [self.random.choice(self.vocabulary) for _ in range(self.size)]
+            self.texts[i] = words
+            self.site_texts[i] = self._mutate(words)
+            with open(os.path.join(self.files_dir, 'post {}.html'.format(i)), mode='w', encoding='utf8') as fd:
+                fd.write('<html><head><title>Post {0}</title></head><body>{1}</body></html>'.format(
+                    i, self._paragraphs(words)
+                ))
+        return self
+
+    def _layout(self, content):
+        return '<html><head><title>Synthetic blog</title></head><body>' \
+               '<div class="body_content">{}</div></body></html>'.format(content)
+
+    def pager_page(self, page):
+        first = (page - 1) * self.per_page + 1
+        cards = []
+        for i in range(first, min(first + self.per_page, self.posts + 1)):
+            cards.append(
+                '<article class="card"><section class="card-body entry-text"><div class="body-text">'
+                '<p>{0}</p><a class="btn" href="/entry/{1}/?page={2}&amp;text=1">Read more</a>'
+                '</div></section></article>'.format(' '.join(self.site_texts[i][:20]), i, page)
+            )
+        pager = ''.join(
+            '<li class="page-item"><a class="page-link" href="/?page={0}">{0}</a></li>'.format(p)
+            for p in range(1, self.pages + 1)
+        )
+        return self._layout('{}<nav><ul class="pagination">{}</ul></nav>'.format(''.join(cards), pager))
+
+    def post_page(self, i):
+        return self._layout(
+            '<article class="card"><section class="card-body entry-text"><div class="body-text">'
+            '{}</div></section></article>'.format(self._paragraphs(self.site_texts[i]))
+        )
+
+    def get_page(self, path, query):
+        """
+            Returns html of page or None if page does not exist
+        """
+        qs = parse_qs(query)
+        parts = [p for p in path.split('/') if p]
+        if not parts:
+            page = int(qs.get('page', ['1'])[0])
+            return self.pager_page(page) if 1 <= page <= self.pages else None
+        if len(parts) == 2 and parts[0] == 'entry' and parts[1].isdigit() and int(parts[1]) in self.site_texts:
+            return self.post_page(int(parts[1]))
+        return None
+
+
+class SyntheticBlogServer:
+    """
+        Serves SyntheticBlog on 127.0.0.1 in background thread
+
+            with SyntheticBlogServer(blog) as server:
+                print(server.url)
+    """
+
+    def __init__(self, blog, port=0) -> None:
+        self.blog = blog
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately, Nagle + delayed ACK would add ~40ms per keep-alive request
+            disable_nagle_algorithm = True
+
+            def _send(self, with_body):
+                purl = urlparse(self.path)
+                html = blog.get_page(purl.path, purl.query)
+                body = (html or 'Not Found').encode('utf8')
+                self.send_response(200 if html is not None else 404)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if with_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self._send(True)
+
+            def do_HEAD(self):
+                self._send(False)
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+
+            def handle_error(self, request, client_address):
+                # clients close connections before end of page (ContentSelector.incremental_container)
+                if not isinstance(sys.exc_info()[1], ConnectionError):
+                    super().handle_error(request, client_address)
+
+        self.httpd = Server(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.__thread = None
+        super().__init__()
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(*self.httpd.server_address[:2])
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class Benchmark:
+    """
+        Base of benchmarks: _run(work_dir) returns result as dictionary and uses _time(...) for timings
+    """
+
+    repeat = 1
+
+    scheduler = None
+    """
+        GetResponse.scheduler during the run, None - requests to the local server are not throttled
+    """
+
+    def _time(self, name, func):
+        """
+            Best time of self.repeat runs is stored
+        """
+        result = None
+        for _ in range(self.repeat):
+            start = perf_counter()
+            result = func()
+            elapsed = perf_counter() - start
+            if name not in self.timings or elapsed < self.timings[name]:
+                self.timings[name] = elapsed
+        return result
+
+    def run(self, output=None):
+        """
+            Returns result as dictionary, if output is passed then result is written there as JSON
+        """
+        self.timings = {}
+        scheduler, GetResponse.scheduler = (GetResponse.scheduler, self.scheduler)
+        try:
+            with tempfile.TemporaryDirectory() as work_dir:
+                result = self._run(work_dir)
+        finally:
+            GetResponse.scheduler = scheduler
+
+        if output:
+            with open(output, mode='w') as fd:
+                json.dump(result, fd, indent=4)
+        return result
+
+
+class ComparePipelineBenchmark(Benchmark):
+    """
+        It times stages of the comparison pipeline and returns (or writes) machine-readable result
+            urls - TextLinksGrabber over the pager
+            files - GetFiles over source files
+            normalize_files - NormalizeContent of all source files
+            normalize_urls - fetching and NormalizeContent of all posts
+            diff - DiffContent ratio and diff of each post with its source file
+            compare - PostTextsComparer.compare() end-to-end
+
+        Common usages
+            result = ComparePipelineBenchmark(posts=200, size=2000).run()
+            ComparePipelineBenchmark(posts=200).run('bench.json')
+    """
+
+    blog_class = SyntheticBlog
+
+    server_class = SyntheticBlogServer
+
+    def __init__(self, posts=None, size=None, mutation_rate=None, per_page=None, repeat=None, seed=0,
+                 comparer_options=None) -> None:
+        self.blog_options = {'posts': posts, 'size': size, 'mutation_rate': mutation_rate, 'per_page': per_page,
+                             'seed': seed}
+        if repeat is not None:
+            self.repeat = int(repeat)
+        # attributes of PostTextsComparer like {'jobs': 4, 'diff_granularity': 'words'}
+        self.comparer_options = dict(comparer_options or {})
+        self.timings = {}
+        super().__init__()
+
+    def _get_comparer(self, url, files_dir, relations_file):
+        comparer = PostTextsComparer(url, files_dir, relations_file)
+        for name, value in self.comparer_options.items():
+            if not hasattr(comparer, name):
+                raise AttributeError('PostTextsComparer has no attribute "{}"'.format(name))
+            setattr(comparer, name, value)
+        return comparer
+
+    def _run(self, work_dir):
+        files_dir = os.path.join(work_dir, 'files')
+        relations_file = os.path.join(work_dir, 'relations.txt')
+        blog = self.blog_class(files_dir, **self.blog_options).generate()
+
+        with self.server_class(blog) as server:
+            url = server.url + '?page=1'
+            comparer = self._get_comparer(url, files_dir, relations_file)
+
+            urls = sorted(self._time('urls', comparer.urls))
+            files = sorted(self._time('files', comparer.files))
+            files_content = self._time(
+                'normalize_files', lambda: {file: PostTextsComparer._read_file_content(file) for file in files}
+            )
+            urls_content = self._time(
+                'normalize_urls', lambda: {url: PostTextsComparer._get_url_content(url) for url in urls}
+            )
+
+            def diff():
+                # posts and files are numbered in same way
+                for url in urls:
+                    file = os.path.join(files_dir, 'post {}.html'.format(urlparse(url).path.split('/')[2]))
+                    content = DiffContent(urls_content[url], files_content[file],
+                                          self.comparer_options.get('diff_granularity'))
+                    content.ratio()
+                    content.compare()
+            self._time('diff', diff)
+
+            def compare():
+                self._get_comparer(url, files_dir, relations_file).compare()
+            self._time('compare', compare)
+
+        return {
+            'benchmark': type(self).__name__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {**{k: getattr(blog, k) for k in ('posts', 'size', 'mutation_rate', 'per_page')},
+                       'repeat': self.repeat, 'seed': self.blog_options['seed'],
+                       'comparer_options': self.comparer_options},
+            'counts': {'urls': len(urls), 'files': len(files)},
+            'timings': self.timings,
+        }
+
+
+class SelectorBenchmark(Benchmark):
+    """
+        Micro-benchmark of ContentSelector's selectors over 'pages' parsed pages of SyntheticBlog
+            cssselect - element.cssselect(selector), CSS is translated and compiled for each page
+            compiled - iteration of ContentSelector, compiled selector is shared by all pages
+
+        Common usages
+            result = SelectorBenchmark(pages=5000).run()
+    """
+
+    blog_class = SyntheticBlog
+
+    selector_classes = (TextsLinksProvider, PagerProvider, TextLinkSelector, BodyTextSelector)
+
+    pages = 2000
+
+    distinct_pages = 20
+
+    def __init__(self, pages=None, repeat=None, seed=0) -> None:
+        if pages is not None:
+            self.pages = int(pages)
+        if repeat is not None:
+            self.repeat = int(repeat)
+        self.seed = seed
+        self.timings = {}
+        super().__init__()
+
+    def _get_elements(self, work_dir):
+        blog = self.blog_class(work_dir, posts=self.distinct_pages * 2, size=50, per_page=2, seed=self.seed)
+        blog.generate()
+        html = [blog.pager_page(page) if page % 2 else blog.post_page(page)
+                for page in range(1, blog.pages + 1)]
+        return [lxml.html.fromstring(html[i % len(html)]) for i in range(self.pages)]
+
+    def _run(self, work_dir):
+        elements = self._get_elements(work_dir)
+        selectors = [cls.selector for cls in self.selector_classes]
+
+        def cssselect():
+            return sum(len(el.cssselect(selector)) for el in elements for selector in selectors)
+
+        def compiled():
+            return sum(len(list(cls(el))) for el in elements for cls in self.selector_classes)
+
+        ContentSelector._compiled_selectors.clear()
+        counts = {'cssselect': self._time('cssselect', cssselect), 'compiled': self._time('compiled', compiled)}
+        if counts['cssselect'] != counts['compiled']:
+            raise ValueError('Selectors returned different results: {}'.format(counts))
+
+        return {
+            'benchmark': type(self).__name__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {'pages': self.pages, 'repeat': self.repeat, 'seed': self.seed,
+                       'selectors': [cls.__name__ for cls in self.selector_classes]},
+            'counts': {'elements': counts['compiled']},
+            'timings': self.timings,
+            'speedup': self.timings['cssselect'] / self.timings['compiled'] if self.timings['compiled'] else None,
+        }
+
+
+class LinkExtractionBenchmark(Benchmark):
+    """
+        Micro-benchmark of link extraction of TextLinksGrabber over 'pages' parsed link-heavy pager pages
+            element - element mode, urljoin(el.base_url, el.get('href')) for each selected element
+            attribute - attribute mode, one compiled XPath returns href strings that are joined with page's base url
+
+        Common usages
+            result = LinkExtractionBenchmark(pages=200, links=1000).run()
+    """
+
+    blog_class = SyntheticBlog
+
+    grabber_class = TextLinksGrabber
+
+    pages = 200
+
+    links = 500
+
+    def __init__(self, pages=None, links=None, repeat=None, seed=0) -> None:
+        if pages is not None:
+            self.pages = int(pages)
+        if links is not None:
+            self.links = int(links)
+        if repeat is not None:
+            self.repeat = int(repeat)
+        self.seed = seed
+        self.timings = {}
+        super().__init__()
+
+    def _get_elements(self, work_dir):
+        blog = self.blog_class(work_dir, posts=self.links * 2, size=5, per_page=self.links, seed=self.seed)
+        blog.generate()
+        url = 'http://blog.lan/?page={}'
+        html = [blog.pager_page(page) for page in range(1, blog.pages + 1)]
+        return [lxml.html.fromstring(html[i % len(html)], base_url=url.format(i % len(html) + 1))
+                for i in range(self.pages)]
+
+    def _extract(self, elements, attribute_mode):
+        grabber = self.grabber_class('http://blog.lan/')
+        grabber.attribute_mode = attribute_mode
+        urls = []
+        for el in elements:
+            grabber.link_provider.content = el
+            urls.extend(grabber._iter_page_links())
+        return urls
+
+    def _run(self, work_dir):
+        elements = self._get_elements(work_dir)
+        urls = {mode: self._time(mode, lambda: self._extract(elements, mode == 'attribute'))
+                for mode in ('element', 'attribute')}
+        if urls['element'] != urls['attribute']:
+            raise ValueError('Extraction modes returned different urls.')
+
+        return {
+            'benchmark': type(self).__name__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {'pages': self.pages, 'links': self.links, 'repeat': self.repeat, 'seed': self.seed},
+            'counts': {'links': len(urls['attribute'])},
+            'timings': self.timings,
+            'links_per_sec': {mode: len(urls[mode]) / elapsed if elapsed else None
+                              for mode, elapsed in self.timings.items()},
+            'speedup': self.timings['element'] / self.timings['attribute'] if self.timings['attribute'] else None,
+        }
+
+
+if __name__ == '__main__':
+
+    json.dump(ComparePipelineBenchmark(posts=20, size=500).run(), sys.stdout, indent=4)
+    print()
+    json.dump(SelectorBenchmark(pages=2000).run(), sys.stdout, indent=4)
+    print()
+    json.dump(LinkExtractionBenchmark(pages=200).run(), sys.stdout, indent=4)
@@ -0,0 +1,151 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: lib
+# File: content_cache.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+"""
+    Cache of normalized content of source files
+"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+
+
+class ContentCache:
+    """
+        It keeps a content (result of some loader, for example str(NormalizeContent(...)))
+        of file by key (realpath, size, mtime, version). If file was changed then key will be changed too
+        and content will be loaded again. 'version' of get(...) describes settings of the loader,
+        content that was loaded with other settings is loaded again.
+
+        In memory it keeps 'maxsize' last used items (LRU eviction), None - all items.
+        If 'file' is passed then all loaded items also are stored in SQLite database,
+        thus next runs will take content from the database without parsing of file.
+
+        Common usages
+            cache = ContentCache(256, 'content_cache.sqlite')
+            content = cache.get('/some/path/to/file.html', lambda file: str(NormalizeContent(...)), version='...')
+            cache.info() - CacheInfo(hits=..., disk_hits=..., misses=..., maxsize=256, currsize=...)
+            cache.close() - stores all uncommitted items into database
+    """
+
+    maxsize = None
+
+    commit_every = 100
+
+    cache_info_class = namedtuple('CacheInfo', ['hits', 'disk_hits', 'misses', 'maxsize', 'currsize'])
+
+    def __init__(self, maxsize=None, file=None) -> None:
+        if maxsize is not None:
+            self.maxsize = int(maxsize)
+        self.file = file
+        self.__items = OrderedDict()
+        self.__lock = threading.RLock()
+        self.__db = None
+        self.__uncommitted = 0
+        self.hits = self.disk_hits = self.misses = 0
+        super().__init__()
+
+    @staticmethod
+    def key(file, version=''):
+        stat = os.stat(file)
+        return os.path.realpath(file), stat.st_size, stat.st_mtime_ns, version
+
+    @property
+    def db(self):
+        if self.__db is None and self.file:
+            self.__db = sqlite3.connect(self.file, check_same_thread=False)
+            columns = [row[1] for row in self.__db.execute('PRAGMA table_info(content)')]
+            if columns and 'version' not in columns:
+                # database of previous format, content is loaded again
+                self.__db.execute('DROP TABLE content')
+            self.__db.execute(
+                'CREATE TABLE IF NOT EXISTS content '
+                '(path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, version TEXT, content TEXT)'
+            )
+        return self.__db
+
+    def _db_get(self, key):
+        if self.db is None:
+            return None
+        path, size, mtime, version = key
+        row = self.db.execute('SELECT size, mtime, version, content FROM content WHERE path = ?', (path,)).fetchone()
+        if row is not None and (row[0], row[1], row[2]) == (size, mtime, version):
+            return row[3]
+        return None
+
+    def _db_put(self, key, content):
+        if self.db is None:
+            return
+        self.db.execute('INSERT OR REPLACE INTO content (path, size, mtime, version, content) VALUES (?, ?, ?, ?, ?)',
+                        (*key, content))
+        self.__uncommitted += 1
+        if self.__uncommitted >= self.commit_every:
+            self.flush()
+
+    def _put(self, key, content):
+        self.__items[key] = content
+        self.__items.move_to_end(key)
+        while self.maxsize is not None and len(self.__items) > self.maxsize:
+            self.__items.popitem(last=False)
+
+    def get(self, file, loader, version=''):
+        """
+            Returns content of file from cache or loader(file) result if cache has no actual content
+            of this version
+        """
+        key = self.key(file, version)
+        with self.__lock:
+            if key in self.__items:
+                self.hits += 1
+                self.__items.move_to_end(key)
+                return self.__items[key]
+
+            content = self._db_get(key)
+            if content is not None:
+                self.disk_hits += 1
+                self._put(key, content)
+                return content
+
+        # loader can be slow, so it is called without lock
+        content = loader(file)
+        with self.__lock:
+            self.misses += 1
+            self._put(key, content)
+            self._db_put(key, content)
+        return content
+
+    def info(self):
+        return self.cache_info_class(self.hits, self.disk_hits, self.misses, self.maxsize, len(self.__items))
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def flush(self):
+        with self.__lock:
+            if self.__db is not None and self.__uncommitted:
+                self.__db.commit()
+            self.__uncommitted = 0
+
+    def close(self):
+        with self.__lock:
+            self.flush()
+            if self.__db is not None:
+                self.__db.close()
+                self.__db = None
+
+
+if __name__ == '__main__':
+
+    cache = ContentCache(2)
+    for file in (__file__, __file__, os.path.dirname(__file__) + '/grabber.py', __file__):
+        print(file, len(cache.get(file, lambda f: open(f).read())))
+    print(cache.info())
+
+    # Result should be like
+    # CacheInfo(hits=2, disk_hits=0, misses=2, maxsize=2, currsize=2)
@@ -0,0 +1,177 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: lib
+# File: frontier.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+"""
+    Crawl frontier - queue of pages that have to be visited
+"""
+import heapq
+import sqlite3
+from collections import deque
+from itertools import count, islice
+
+
+class CrawlFrontier:
+    """
+        Each url is enqueued once (urls that have been pushed are remembered), so push(...), pop()
+        and membership are O(1). Urls are popped in order of pushing or, if 'priority' is passed,
+        in order of priority(url) (lower is first, same priorities - in order of pushing).
+
+        When more than memory_limit urls are pending, the rest is spilled into SQLite file
+        (spill_file, '' - temporary file that is removed when it is closed) and loaded back
+        by batches. Every url in memory precedes every url on disk, so order is kept.
+
+        'seen' is container of pushed urls (add(...) and 'in'), set by default. UrlSet (lib/urlcanon.py)
+        compares urls by canonical form and keeps only fingerprints of them.
+
+        Common usages
+            frontier = CrawlFrontier(['https://blog.lan/'])
+            frontier.push('https://blog.lan/?page=2') - False if url has been pushed already
+            frontier.extend(urls)
+            while frontier:
+                url = frontier.pop()
+            frontier.peek(3) - up to 3 next urls, they are not removed
+            frontier.close()
+    """
+
+    memory_limit = 100000
+
+    spill_file = ''
+
+    def __init__(self, urls=(), priority=None, memory_limit=None, spill_file=None, seen=None) -> None:
+        self.priority = priority
+        if memory_limit is not None:
+            self.memory_limit = max(2, int(memory_limit))
+        if spill_file is not None:
+            self.spill_file = spill_file
+        self.__seen = set() if seen is None else seen
+        self.__sequence = count()
+        # FIFO - deque of (0, seq, url), priority - heap of (priority, seq, url)
+        self.__pending = [] if priority is not None else deque()
+        self.__db = None
+        self.__spilled = 0
+        self.__spilled_min = None
+        super().__init__()
+        self.extend(urls)
+
+    def __len__(self):
+        return len(self.__pending) + self.__spilled
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __contains__(self, url):
+        """
+            True if url has been pushed (it can be popped already)
+        """
+        return url in self.__seen
+
+    def push(self, url):
+        if url in self.__seen:
+            return False
+        self.__seen.add(url)
+        item = (self.priority(url) if self.priority is not None else 0, next(self.__sequence), url)
+
+        if self.__spilled and item >= self.__spilled_min:
+            self._spill([item])
+        elif self.priority is None:
+            if len(self.__pending) >= self.memory_limit:
+                self._spill([item])
+            else:
+                self.__pending.append(item)
+        else:
+            heapq.heappush(self.__pending, item)
+            if len(self.__pending) > self.memory_limit:
+                # the greater half goes to disk, so the rest still precedes everything on disk
+                items = sorted(self.__pending)
+                keep = self.memory_limit // 2
+                self.__pending = items[:keep]
+                self._spill(items[keep:])
+        return True
+
+    def extend(self, urls):
+        for url in urls:
+            self.push(url)
+
+    def pop(self):
+        if not self.__pending:
+            self._load()
+        if not self.__pending:
+            raise IndexError('pop from empty frontier')
+        if self.priority is None:
+            return self.__pending.popleft()[2]
+        return heapq.heappop(self.__pending)[2]
+
+    def peek(self, n=1):
+        while len(self.__pending) < n and self.__spilled:
+            self._load()
+        if self.priority is None:
+            return [item[2] for item in islice(self.__pending, n)]
+        return [item[2] for item in heapq.nsmallest(n, self.__pending)]
+
+    def _get_db(self):
+        if self.__db is None:
+            self.__db = sqlite3.connect(self.spill_file)
+            self.__db.execute('DROP TABLE IF EXISTS frontier')
+            self.__db.execute(
+                'CREATE TABLE frontier (priority REAL, seq INTEGER, url TEXT, PRIMARY KEY (priority, seq))'
+            )
+        return self.__db
+
+    def _spill(self, items):
+        self._get_db().executemany('INSERT INTO frontier (priority, seq, url) VALUES (?, ?, ?)', items)
+        self.__spilled += len(items)
+        first = min(items)
+        if self.__spilled_min is None or first < self.__spilled_min:
+            self.__spilled_min = first
+
+    def _load(self):
+        """
+            Moves next urls from disk into memory
+        """
+        if not self.__spilled:
+            return
+        db = self._get_db()
+        size = max(1, self.memory_limit // 2 - len(self.__pending))
+        items = db.execute('SELECT priority, seq, url FROM frontier ORDER BY priority, seq LIMIT ?',
+                           (size,)).fetchall()
+        last_priority, last_seq = items[-1][:2]
+        db.execute('DELETE FROM frontier WHERE priority < ? OR (priority = ? AND seq <= ?)',
+                   (last_priority, last_priority, last_seq))
+        self.__spilled -= len(items)
+        self.__spilled_min = db.execute(
+            'SELECT priority, seq, url FROM frontier ORDER BY priority, seq LIMIT 1'
+        ).fetchone() if self.__spilled else None
+
+        if self.priority is None:
+            self.__pending.extend(items)
+        else:
+            for item in items:
+                heapq.heappush(self.__pending, item)
+
+    def close(self):
+        if self.__db is not None:
+            self.__db.close()
+            self.__db = None
+        self.__pending.clear()
+        self.__spilled, self.__spilled_min = (0, None)
+
+
+if __name__ == '__main__':
+
+    frontier = CrawlFrontier(['/?page=1', '/?page=2', '/?page=1'], memory_limit=2)
+    frontier.extend(['/?page=3', '/?page=2', '/?page=4'])
+    print(len(frontier), frontier.peek(3), [frontier.pop() for _ in range(len(frontier))])
+    frontier.close()
+    # Result should be
+    # 4 ['/?page=1', '/?page=2', '/?page=3'] ['/?page=1', '/?page=2', '/?page=3', '/?page=4']
+
+    frontier = CrawlFrontier(priority=lambda url: -int(url.rpartition('=')[2]), memory_limit=2)
+    frontier.extend(['/?page=1', '/?page=3', '/?page=2', '/?page=4'])
+    print([frontier.pop() for _ in range(len(frontier))])
+    frontier.close()
+    # Result should be
+    # ['/?page=4', '/?page=3', '/?page=2', '/?page=1']
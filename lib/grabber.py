@@ -9,14 +9,21 @@
 """
     Site content grabber
 """
+import copy
 import io
 import hashlib
+from functools import lru_cache
 from urllib.request import Request
 from urllib.parse import urljoin, urlparse, urlunparse, parse_qs, urlencode
-from lxml.html import parse as html_parser
-from lxml.etree import _Element
+from lxml.html import parse as html_parser, HtmlElementClassLookup
+from lxml.etree import _Element, HTMLPullParser, XPath
+from lxml.cssselect import LxmlHTMLTranslator
+from cssselect.parser import parse as css_parse, CombinedSelector
 from typing import Iterable, Iterator, Union
 from lib.ssl_provider import GetResponse
+from lib.frontier import CrawlFrontier
+from lib.urlcanon import UrlCanonicalizer, UrlSet, BloomFilter
+from concurrent.futures import ThreadPoolExecutor
 from http.client import HTTPResponse
 
 
@@ -27,6 +34,11 @@ def get_content_md5(content, remove_blanks=True):
     return hashlib.md5(content).hexdigest()
 
 
+@lru_cache(maxsize=65536)
+def cached_urljoin(base, url):
+    return urljoin(base, url)
+
+
 def iselement(el: _Element, name, attrs=None):
     result = False
     if el.tag == name:
@@ -50,12 +62,70 @@ def check_element(el: _Element, name, attrs=None, throw_exception=True):
     return result
 
 
+CSS_COMBINATOR_AXES = {
+    ' ': 'ancestor::{}',
+    '>': 'parent::{}',
+    '~': 'preceding-sibling::{}',
+    '+': 'preceding-sibling::*[1]/self::{}',
+}
+
+
+def css_to_self_test(css, translator=None):
+    """
+        Translates CSS selector into XPath expression that is true if the context element itself
+        matches the selector. element.cssselect(css) searches descendants of element,
+        so combinators are reversed here - 'div.a > p' is 'self::p[parent::div[...]]'
+    """
+    translator = translator or LxmlHTMLTranslator()
+
+    def step(tree):
+        if isinstance(tree, CombinedSelector):
+            return '{}[{}]'.format(step(tree.subselector), CSS_COMBINATOR_AXES[tree.combinator].format(
+                step(tree.selector)
+            ))
+        expr = translator.xpath(tree)
+        return '{}[{}]'.format(expr.element, expr.condition) if expr.condition else expr.element
+
+    tests = []
+    for selector in css_parse(css):
+        if selector.pseudo_element:
+            raise ValueError('Pseudo-elements are not supported: {}'.format(css))
+        tests.append('self::' + step(selector.parsed_tree))
+    return ' or '.join(tests)
+
+
 class ContentSelector(Iterable):
+    """
+        If 'incremental_container' (CSS selector) is set then content (stream) is fed into lxml pull parser
+        by chunks of 'incremental_chunk_size' bytes and reading is stopped when first element
+        that matches 'incremental_container' is complete (its end tag is parsed). Rest of stream is read
+        without parsing if it is not greater than 'incremental_drain_size' bytes (so keep-alive connection
+        of the response can be reused), bigger rest is not read and the stream is closed.
+        So 'selector' and selectors of other providers that share this content should select elements
+        inside this container, elements after it can be absent.
+        If stream has 'read_to_end' attribute (like CachingResponse, lib/http_cache.py) then the rest is read
+        without parsing whatever size it has.
+
+        CSS selectors are translated into XPath and compiled once, compiled ones are shared by all
+        instances of all ContentSelector classes (see compile_selector).
+
+        If 'selected_elements' is set (for example, by MultiSelector for several providers at once)
+        then they are iterated instead of selecting, it is reset when content is changed.
+    """
     selector = 'body'
     __content = None
 
+    incremental_container = None
+
+    incremental_chunk_size = 16 * 1024
+
+    incremental_drain_size = 64 * 1024
+
+    _compiled_selectors = {}
+
     def __init__(self, content: Union[HTTPResponse, _Element, None] = None, selector=None) -> None:
         self.__current_element = None
+        self.selected_elements = None
         self.content = content
 
         if selector is not None:
@@ -78,7 +148,10 @@ class ContentSelector(Iterable):
     def content(self, value):
         if value is not None:
             if isinstance(value, (io.RawIOBase, io.BufferedIOBase)):
-                value = html_parser(value).getroot()
+                if self.incremental_container:
+                    value = self._parse_incremental(value)
+                else:
+                    value = html_parser(value).getroot()
             elif isinstance(value, _Element):
                 pass
             else:
@@ -86,27 +159,136 @@ class ContentSelector(Iterable):
                                  'or instance of "{}" type.'.format(_Element.__name__))
 
         self.__content = value
+        self.selected_elements = None
+
+    @classmethod
+    def compile_selector(cls, selector, is_self_test=False):
+        """
+            Returns compiled XPath of CSS selector, same as element.cssselect(selector) uses.
+            is_self_test=True - XPath tests the element itself against the selector (see css_to_self_test)
+        """
+        key = (selector, is_self_test)
+        xpath = ContentSelector._compiled_selectors.get(key)
+        if xpath is None:
+            if is_self_test:
+                xpath = XPath(css_to_self_test(selector))
+            else:
+                xpath = XPath(LxmlHTMLTranslator().css_to_xpath(selector))
+            ContentSelector._compiled_selectors[key] = xpath
+        return xpath
+
+    @staticmethod
+    def _get_base_url(stream):
+        # same as lxml.html.parse(...) does, el.base_url depends on it
+        if hasattr(stream, 'geturl'):
+            return stream.geturl()
+        name = getattr(stream, 'name', None)
+        return name if isinstance(name, str) else None
+
+    def _parse_incremental(self, stream):
+        parser = HTMLPullParser(events=('end',), base_url=self._get_base_url(stream))
+        parser.set_element_class_lookup(HtmlElementClassLookup())
+        is_container = self.compile_selector(self.incremental_container, True)
+
+        is_complete = False
+        while not is_complete:
+            data = stream.read(self.incremental_chunk_size)
+            if not data:
+                break
+            parser.feed(data)
+            is_complete = any(is_container(el) for _, el in parser.read_events())
+
+        root = parser.close()
+        if is_complete:
+            limit = None if getattr(stream, 'read_to_end', False) else self.incremental_drain_size
+            if not self._drain(stream, limit):
+                stream.close()
+        return root
+
+    def _drain(self, stream, limit=None):
+        """
+            Reads rest of stream without parsing, it returns False (nothing or a part is read)
+            if more than 'limit' bytes are left
+        """
+        length = getattr(stream, 'length', None)
+        if limit is not None and isinstance(length, int) and length > limit:
+            # HTTPResponse knows rest of body from Content-Length
+            return False
+
+        size = 0
+        while limit is None or size <= limit:
+            data = stream.read(self.incremental_chunk_size)
+            if not data:
+                return True
+            size += len(data)
+        return False
 
     def process_element(self, el):
         return el
 
     def __iter__(self):
-        for el in self.content.cssselect(self.selector):
+        elements = self.selected_elements
+        if elements is None:
+            elements = self.compile_selector(self.selector)(self.content)
+        for el in elements:
             self.__current_element = el
             yield self.process_element(el)
         self.__current_element = None
 
 
+class MultiSelector:
+    """
+        Evaluates several named CSS selectors by one traversal of the tree
+        (descendant-or-self::*[test1 or test2 ...]) and returns found elements grouped by names.
+        Each group is same as element.cssselect(selector) returns (document order).
+
+        Common usages
+            extractor = MultiSelector.get({'links': 'article a.btn', 'pages': 'nav a.page-link'})
+            extractor(root) - {'links': [...], 'pages': [...]}
+    """
+
+    _instances = {}
+
+    def __init__(self, selectors) -> None:
+        self.selectors = dict(selectors)
+        self.tests = {name: ContentSelector.compile_selector(selector, True)
+                      for name, selector in self.selectors.items()}
+        self.xpath = XPath('descendant-or-self::*[{}]'.format(
+            ' or '.join('({})'.format(css_to_self_test(selector)) for selector in self.selectors.values())
+        ))
+        super().__init__()
+
+    @classmethod
+    def get(cls, selectors):
+        """
+            Instances are cached, so XPath of same selectors is compiled once
+        """
+        key = tuple(sorted(dict(selectors).items()))
+        inst = cls._instances.get(key)
+        if inst is None:
+            inst = cls._instances[key] = cls(selectors)
+        return inst
+
+    def __call__(self, content):
+        result = {name: [] for name in self.selectors}
+        tests = self.tests.items()
+        for el in self.xpath(content):
+            for name, test in tests:
+                if test(el):
+                    result[name].append(el)
+        return result
+
+
 class LinksGrabberResponseStatusIsNot200(Exception):
     pass
 
 
 class LinksGrabber(Iterable):
     """
-        It can duplicate text's links due to 'https://test.blog.lan/' and 'https://test.blog.lan/?page=1'
-        can be same pages as for server but grabber counts this links as different.
-        It can be fixed if a start url will be 'https://test.blog.lan/?page=1'. In other words,
-        like url for first page in pager.
+        Pages are compared by canonical urls (url_canonicalizer), so 'https://test.blog.lan/'
+        and 'https://test.blog.lan:443/' are same page. 'https://test.blog.lan/' and 'https://test.blog.lan/?page=1'
+        can be same pages as for server too, url_canonicalizer with default_params={'page': '1'} fixes it
+        (see TextLinksGrabber), otherwise text's links can be duplicated.
 
         For browser emulation it will add the 'headers' class argument as 'headers' parameter
         in urllib.request.Request(.... headers={} ....).
@@ -129,8 +311,54 @@ class LinksGrabber(Iterable):
         Iterator that provides links over page navigator pages
     """
 
+    attribute_mode = False
+    """
+        If it is True and link_provider is ContentSelector then links are taken as strings by one compiled XPath
+        (selector + /@href or /@src according to element_url_attr) and joined with base url of the page
+        that is taken once (urljoin is memoized). Elements are not validated by check_element(...)
+        and not passed into link_provider.process_element(...), elements without the attribute are skipped,
+        link_provider.current_element stays None.
+    """
+
+    _attribute_xpaths = {}
+
+    lookahead = 0
+    """
+        If it is greater than 0 then pager of the page is parsed before its links are yielded
+        and up to 'lookahead' next pages are requested and parsed in background threads
+        while links of the current page are consumed. Order of links and current_start_url are same.
+        It works if page_provider is ContentSelector (it has 'content').
+    """
+
+    frontier_class = CrawlFrontier
+    """
+        Queue of pages to visit, each page found by page_provider is queued once
+        and pages are visited in order of discovery (see create_frontier(...))
+    """
+
+    frontier_memory_limit = None
+    """
+        Pending pages that are kept in memory, the rest is spilled on disk. None - CrawlFrontier's default
+    """
+
+    url_canonicalizer = UrlCanonicalizer()
+    """
+        Visited and queued pages are compared by canonical form of their urls
+    """
+
+    seen_urls_capacity = None
+    """
+        If it is set then fingerprints of visited and queued pages are kept by Bloom filter with fixed memory
+        for this number of pages (seen_urls_error_rate of pages can be skipped wrongly)
+        instead of set of fingerprints
+    """
+
+    seen_urls_error_rate = 0.0001
+
     def __init__(self, start_url='', link_provider=None, page_provider=None) -> None:
         self.__current_start_url = None
+        # (content, MultiSelector, {'link': [...], 'page': [...]}) of last page that was processed by MultiSelector
+        self.__extracted = None
         self.start_url = start_url
         self.link_provider = link_provider
         self.page_provider = page_provider
@@ -218,21 +446,81 @@ class LinksGrabber(Iterable):
         """
         return url
 
+    def _get_page_content(self, url, provider=None):
+        """
+            It requests page from Web server by url and returns parsed content of provider
+            (link_provider by default)
+        """
+        provider = self.link_provider if provider is None else provider
+        resp = GetResponse(Request(url, headers=self.headers)).process()
+        if resp.status != 200:
+            resp.close()
+            raise LinksGrabberResponseStatusIsNot200(
+                'HTTPResponse returns status "{}" on url "{}".'.format(resp.status, url)
+            )
+        provider.content = resp
+        # content is parsed already, the connection can be reused
+        resp.close()
+        return provider.content
+
+    def _prefetch_page_content(self, url):
+        # link_provider is used by main thread, so the page is parsed by its copy (with same settings)
+        provider = copy.copy(self.link_provider)
+        provider.content = None
+        return self._get_page_content(url, provider)
+
+    def _extract(self, content):
+        """
+            If both providers are ContentSelector then elements of both are found by one traversal
+            of content (MultiSelector). Returns {'link': [...], 'page': [...]} or None.
+            In attribute_mode links are taken by their own XPath, so only {'page': [...]} is returned.
+        """
+        if content is None or not isinstance(self.link_provider, ContentSelector) \
+                or not isinstance(self.page_provider, ContentSelector):
+            return None
+        selectors = {'page': self.page_provider.selector}
+        if not self.attribute_mode:
+            selectors['link'] = self.link_provider.selector
+        extractor = MultiSelector.get(selectors)
+        if self.__extracted is None or self.__extracted[0] is not content or self.__extracted[1] is not extractor:
+            self.__extracted = (content, extractor, extractor(content))
+        return self.__extracted[2]
+
+    def _get_attribute_xpath(self, selector):
+        key = (selector, tuple(sorted(self.element_url_attr.items())))
+        xpath = LinksGrabber._attribute_xpaths.get(key)
+        if xpath is None:
+            attrs = ' or '.join("(name() = '{}' and parent::{})".format(attr, tag) for tag, attr in key[1])
+            xpath = LinksGrabber._attribute_xpaths[key] = XPath(
+                '({})/@*[{}]'.format(LxmlHTMLTranslator().css_to_xpath(selector), attrs), smart_strings=False
+            )
+        return xpath
+
+    def _iter_page_attribute_links(self):
+        content = self.link_provider.content
+        base_url = content.base_url
+        for url in self._get_attribute_xpath(self.link_provider.selector)(content):
+            yield cached_urljoin(base_url, url)
+
+    def _iter_page_links(self):
+        if self.attribute_mode and isinstance(self.link_provider, ContentSelector):
+            yield from self._iter_page_attribute_links()
+            return
+
+        matches = self._extract(self.link_provider.content)
+        if matches is not None:
+            self.link_provider.selected_elements = matches['link']
+        for text_url_el in self.link_provider:
+            yield self._el2url(text_url_el)
+
     def _iter_links(self, url, processed_urls):
         """
             It requests page from Web server by url then parse page
             and yield the links that defined by link_provider
         """
         if url not in processed_urls:
-            resp = GetResponse(Request(url, headers=self.headers)).process()
-            if resp.status == 200:
-                self.link_provider.content = resp
-                for text_url_el in self.link_provider:
-                    yield self._el2url(text_url_el)
-            else:
-                raise LinksGrabberResponseStatusIsNot200(
-                    'HTTPResponse returns status "{}" on url "{}".'.format(resp.status, url)
-                )
+            self._get_page_content(url)
+            yield from self._iter_page_links()
             processed_urls.add(url)
 
     def _get_page_urls(self, page_provider, content, processed_urls: set):
@@ -245,9 +533,12 @@ class LinksGrabber(Iterable):
         """
         new_page_urls = page_provider
         if hasattr(page_provider, 'content'):
-            new_page_urls = []
+            new_page_urls, new_page_set = ([], UrlSet(self.url_canonicalizer))
             # need to parse the content to grab page's links
             page_provider.content = content
+            matches = self._extract(content) if page_provider is self.page_provider else None
+            if matches is not None:
+                page_provider.selected_elements = matches['page']
 
             for page_url_el in page_provider:
                 page_url = page_url_el
@@ -257,26 +548,87 @@ class LinksGrabber(Iterable):
 
                 page_url = self.process_page_url(page_url)
                 # page_url not in new_page_urls the fix if current page has link on itself
-                if page_url not in processed_urls and page_url not in new_page_urls:
+                if page_url not in processed_urls and page_url not in new_page_set:
+                    new_page_set.add(page_url)
                     new_page_urls.append(page_url)
         return new_page_urls
 
-    def __iter__(self) -> Iterator:
-        processed_urls = set()
-        page_urls = [self.start_url]
-        while page_urls:
-            # TODO: pop(0) could be reworked into len of iterable .... for save original
-            # self.page_provider if it is list
-            self.__current_start_url = page_urls.pop(0)
-            # gets a content of current page (url) and yield links from
-            yield from self._iter_links(self.__current_start_url, processed_urls)
-
-            # get pager's links if last exists otherwise empty list or
-            # self.page_provider if it simple iterable
-
-            page_urls = self._get_page_urls(
+    def create_seen_urls(self):
+        """
+            Returns empty set of page urls that compares them by canonical form
+        """
+        fingerprints = None
+        if self.seen_urls_capacity:
+            fingerprints = BloomFilter(self.seen_urls_capacity, self.seen_urls_error_rate)
+        return UrlSet(self.url_canonicalizer, fingerprints)
+
+    def create_frontier(self):
+        """
+            Returns empty frontier of pages, it can be overridden to visit pages by priority, for example
+            return self.frontier_class(priority=..., memory_limit=self.frontier_memory_limit,
+                                       seen=self.create_seen_urls())
+        """
+        return self.frontier_class(memory_limit=self.frontier_memory_limit, seen=self.create_seen_urls())
+
+    def _get_frontier(self):
+        frontier = self.create_frontier()
+        frontier.push(self.start_url)
+        if not hasattr(self.page_provider, 'content') and isinstance(self.page_provider, Iterable):
+            # simple iterable of pages is not changed, its urls are visited after the start url
+            frontier.extend(self.page_provider)
+        return frontier
+
+    def _push_page_urls(self, frontier, processed_urls):
+        if hasattr(self.page_provider, 'content'):
+            frontier.extend(self._get_page_urls(
                 self.page_provider, getattr(self.link_provider, 'content', None), processed_urls
-            )
+            ))
+
+    def _iter_lookahead(self):
+        processed_urls = self.create_seen_urls()
+        frontier = self._get_frontier()
+        prefetched = {}
+        executor = ThreadPoolExecutor(self.lookahead)
+        try:
+            while frontier:
+                # frontier returns each url once
+                url = self.__current_start_url = frontier.pop()
+                future = prefetched.pop(url, None)
+                self.link_provider.content = self._get_page_content(url) if future is None else future.result()
+                processed_urls.add(url)
+
+                self._push_page_urls(frontier, processed_urls)
+                for page_url in frontier.peek(self.lookahead):
+                    if page_url not in prefetched:
+                        prefetched[page_url] = executor.submit(self._prefetch_page_content, page_url)
+
+                yield from self._iter_page_links()
+        finally:
+            for future in prefetched.values():
+                future.cancel()
+            executor.shutdown(wait=False)
+            frontier.close()
+
+        self.__current_start_url = None
+
+    def __iter__(self) -> Iterator:
+        if self.lookahead > 0 and hasattr(self.page_provider, 'content'):
+            yield from self._iter_lookahead()
+            return
+
+        processed_urls = self.create_seen_urls()
+        frontier = self._get_frontier()
+        try:
+            while frontier:
+                self.__current_start_url = frontier.pop()
+                # gets a content of current page (url) and yield links from
+                yield from self._iter_links(self.__current_start_url, processed_urls)
+
+                # pager's links of the page are queued if pager exists,
+                # urls of self.page_provider (if it is simple iterable) have been queued at start
+                self._push_page_urls(frontier, processed_urls)
+        finally:
+            frontier.close()
 
         self.__current_start_url = None
 
@@ -9,6 +9,7 @@ from collections import namedtuple
 
 from lxml.etree import _Element
 import difflib
+import re
 
 
 class NormalizeContent:
@@ -47,20 +48,92 @@ class NormalizeContent:
 
 
 class DiffContent:
+    """
+        Compares two texts (or lxml elements, their content will be normalized).
+
+        granularity defines what is compared by difflib.SequenceMatcher
+            'chars' - characters, it is most precise but very slow on big texts
+            'words' - words (not whitespace sequences)
+            'sentences' - sentences (text till '.', '!' or '?' followed by whitespace)
+        For 'words' and 'sentences' the ratio is computed over tokens, but a_index/b_index
+        of ComparisonResult are still offsets of characters in normalized texts.
+    """
 
     ignore_empty_differences = True
 
+    granularity = 'chars'
+
+    tokenizers = {
+        'words': re.compile(r'\S+'),
+        'sentences': re.compile(r'\S.*?(?:[.!?](?=\s)|$)'),
+    }
+
     comparison_result_class = namedtuple('ComparisonResult',
                                          ['tag', 'a_index', 'a_diff', 'b_index', 'b_diff', 'diff_ex'],
                                          defaults=('', -1, '', -1, '', '')
                                          )
 
-    def __init__(self, a, b) -> None:
+    def __init__(self, a, b, granularity=None) -> None:
         self.a = str(NormalizeContent(a)) if isinstance(a, _Element) else NormalizeContent._normalize_string(str(a))
         self.b = str(NormalizeContent(b)) if isinstance(a, _Element) else NormalizeContent._normalize_string(str(b))
-        self.sequence_matcher = difflib.SequenceMatcher(a=self.a, b=self.b)
+        if granularity is not None:
+            self.granularity = granularity
+        if self.granularity != 'chars' and self.granularity not in self.tokenizers:
+            raise ValueError('granularity is {} but must be one of {}'.format(
+                self.granularity, ('chars', *self.tokenizers)
+            ))
+        self.__sequence_matcher = None
+        self.__tokens = None
         super().__init__()
 
+    def _tokenize(self, s):
+        """
+            Returns tokens and offsets of their starts and ends in s
+        """
+        tokens, starts, ends = ([], [], [])
+        for m in self.tokenizers[self.granularity].finditer(s):
+            tokens.append(m.group())
+            starts.append(m.start())
+            ends.append(m.end())
+        return tokens, starts, ends
+
+    def _get_tokens(self):
+        if self.__tokens is None:
+            if self.granularity == 'chars':
+                self.__tokens = (self.a, self.b)
+            else:
+                self.__tokens = (self._tokenize(self.a), self._tokenize(self.b))
+        return self.__tokens
+
+    @property
+    def tokens(self):
+        """
+            2-tuple of tokens for 'a' and 'b', for 'chars' granularity these are strings itself
+        """
+        return tuple(t if isinstance(t, str) else t[0] for t in self._get_tokens())
+
+    def _char_range(self, tokens_index, bi, ei):
+        """
+            Converts range of tokens [bi, ei) into range of characters
+        """
+        tokens = self._get_tokens()[tokens_index]
+        if isinstance(tokens, str):
+            return bi, ei
+        _, starts, ends = tokens
+        if bi == ei:
+            pos = starts[bi] if bi < len(starts) else len(self.a if tokens_index == 0 else self.b)
+            return pos, pos
+        return starts[bi], ends[ei - 1]
+
+    @property
+    def sequence_matcher(self):
+        # it is created on demand, the creation is not cheap (indexing of 'b') but not always needed
+        if self.__sequence_matcher is None:
+            a, b = self.tokens
+            # for tokens autojunk would throw away frequent words like 'the' from matching
+            self.__sequence_matcher = difflib.SequenceMatcher(a=a, b=b, autojunk=isinstance(a, str))
+        return self.__sequence_matcher
+
     def compare(self):
 
         def get_diff_ex(s, bi, ei):
@@ -78,16 +151,18 @@ class DiffContent:
         for tag, a_bi, a_ei, b_bi, b_ei in seq_match.get_opcodes():
             # tag is one of theses ('replace', 'delete', 'insert', 'equal')
             if tag != 'equal':
-                adif = seq_match.a[a_bi:a_ei]
-                bdif = seq_match.b[b_bi:b_ei]
+                a_bi, a_ei = self._char_range(0, a_bi, a_ei)
+                b_bi, b_ei = self._char_range(1, b_bi, b_ei)
+                adif = self.a[a_bi:a_ei]
+                bdif = self.b[b_bi:b_ei]
                 if self.ignore_empty_differences:
                     adif = adif.strip()
                     bdif = bdif.strip()
                 if adif != bdif:
                     if adif:
-                        dif_ex = get_diff_ex(seq_match.a, a_bi, a_ei)
+                        dif_ex = get_diff_ex(self.a, a_bi, a_ei)
                     else:
-                        dif_ex = get_diff_ex(seq_match.b, b_bi, b_ei)
+                        dif_ex = get_diff_ex(self.b, b_bi, b_ei)
                     result.append(self.comparison_result_class(tag, a_bi, adif, b_bi, bdif, dif_ex))
         return result
 
@@ -97,6 +172,23 @@ class DiffContent:
     def ratio(self):
         return self.sequence_matcher.ratio()
 
+    def length_ratio(self):
+        """
+            Upper bound of ratio() that depends on lengths only. It does not need the sequence_matcher,
+            thus it is the cheapest one. Same as sequence_matcher.real_quick_ratio()
+        """
+        la, lb = map(len, self.tokens)
+        return 2.0 * min(la, lb) / (la + lb) if la + lb else 1.0
+
+    def real_quick_ratio(self):
+        return self.sequence_matcher.real_quick_ratio()
+
+    def quick_ratio(self):
+        """
+            Upper bound of ratio() that is faster than ratio() but slower than length_ratio()
+        """
+        return self.sequence_matcher.quick_ratio()
+
 
 if __name__ == '__main__':
 
@@ -0,0 +1,235 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: lib
+# File: http_cache.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+"""
+    On-disk HTTP cache with conditional requests (ETag / Last-Modified)
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import namedtuple
+from email.message import Message
+from urllib.request import Request
+
+
+class CachedResponse(io.BytesIO):
+    """
+        Response that is served from the cache (server answered 304 Not Modified).
+        It has same attributes as HTTPResponse which are used by the project.
+    """
+
+    def __init__(self, body, url, status, reason, headers) -> None:
+        super().__init__(body)
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = Message()
+        for name, value in headers:
+            self.headers[name] = value
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def getheaders(self):
+        return self.headers.items()
+
+    def geturl(self):
+        return self.url
+
+    def getcode(self):
+        return self.status
+
+    def info(self):
+        return self.headers
+
+
+class CachingResponse(io.BufferedIOBase):
+    """
+        Wrapper of HTTPResponse that copies the read body into temporary file.
+        When body was read to the end, the file and its metadata are committed into the cache.
+        If response was closed before end of body then nothing is stored.
+    """
+
+    read_to_end = True
+    """
+        Readers that do not need whole body (ContentSelector.incremental_container) read the rest
+        instead of closing, thus the body is stored
+    """
+
+    def __init__(self, response, directory, commit) -> None:
+        super().__init__()
+        self.response = response
+        self.__commit = commit
+        self.__fd = tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False)
+
+    def __getattr__(self, name):
+        # status, reason, headers, url, getheader(...) etc. are taken from the response
+        return getattr(self.response, name)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        is_all = size is None or size < 0
+        data = self.response.read() if is_all else self.response.read(size)
+        if self.__fd is not None:
+            if data:
+                self.__fd.write(data)
+            if is_all or not data:
+                self._finish(True)
+        return data
+
+    def read1(self, size=-1):
+        return self.read(size)
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def _finish(self, is_complete):
+        fd, self.__fd = (self.__fd, None)
+        if fd is None:
+            return
+        fd.close()
+        if is_complete:
+            self.__commit(fd.name)
+        else:
+            os.unlink(fd.name)
+
+    def close(self):
+        try:
+            self._finish(False)
+            self.response.close()
+        finally:
+            super().close()
+
+
+class HttpCache:
+    """
+        It stores bodies of 200 responses with their ETag and Last-Modified values in 'directory'
+        (<md5 of url>.json - metadata, <md5 of url>.body - body). Next request of same url
+        is sent with If-None-Match / If-Modified-Since headers and if server answers 304 Not Modified
+        then body is served from disk.
+
+        Common usages
+            cache = HttpCache('http_cache')
+            entry = cache.get(url) - metadata dictionary or None
+            req = cache.conditional_request(url, entry)
+            cache.response(entry) - CachedResponse, when server has answered 304
+            cache.store(url, resp) - CachingResponse, body will be stored when it is read to the end
+            cache.info() - HttpCacheInfo(hits=..., misses=..., stores=...)
+    """
+
+    cache_info_class = namedtuple('HttpCacheInfo', ['hits', 'misses', 'stores'])
+
+    def __init__(self, directory) -> None:
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self.__lock = threading.Lock()
+        self.hits = self.misses = self.stores = 0
+        super().__init__()
+
+    @staticmethod
+    def _get_url(url):
+        return url.full_url if isinstance(url, Request) else url
+
+    def _path(self, url, ext):
+        return os.path.join(self.directory, hashlib.md5(url.encode('utf8')).hexdigest() + ext)
+
+    def get(self, url):
+        url = self._get_url(url)
+        try:
+            with open(self._path(url, '.json'), mode='r', encoding='utf8') as fd:
+                entry = json.load(fd)
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != url or not os.path.exists(self._path(url, '.body')):
+            return None
+        return entry
+
+    def conditional_request(self, url, entry):
+        """
+            Returns Request with validators of entry, original request (if it is Request) is not changed
+        """
+        if isinstance(url, Request):
+            req = Request(url.full_url, data=url.data, headers=dict(url.header_items()),
+                          origin_req_host=url.origin_req_host, unverifiable=url.unverifiable, method=url.get_method())
+        else:
+            req = Request(url)
+
+        if entry is not None:
+            if entry.get('etag'):
+                req.add_header('If-None-Match', entry['etag'])
+            if entry.get('last_modified'):
+                req.add_header('If-Modified-Since', entry['last_modified'])
+        return req
+
+    def response(self, entry):
+        with open(self._path(entry['url'], '.body'), mode='rb') as fd:
+            body = fd.read()
+        with self.__lock:
+            self.hits += 1
+        return CachedResponse(body, entry['response_url'], entry['status'], entry['reason'], entry['headers'])
+
+    def store(self, url, resp):
+        """
+            Returns response which should be used instead of resp
+        """
+        url = self._get_url(url)
+        with self.__lock:
+            self.misses += 1
+
+        etag, last_modified = (resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+        if resp.status != 200 or not (etag or last_modified):
+            # it can't be validated later
+            return resp
+
+        entry = {
+            'url': url,
+            'response_url': resp.geturl() if hasattr(resp, 'geturl') else url,
+            'status': resp.status,
+            'reason': resp.reason,
+            'headers': list(resp.headers.items()),
+            'etag': etag,
+            'last_modified': last_modified,
+        }
+
+        def commit(tmp_file):
+            os.replace(tmp_file, self._path(url, '.body'))
+            fd, tmp_meta = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, mode='w', encoding='utf8') as meta:
+                json.dump(entry, meta)
+            os.replace(tmp_meta, self._path(url, '.json'))
+            with self.__lock:
+                self.stores += 1
+
+        return CachingResponse(resp, self.directory, commit)
+
+    def info(self):
+        return self.cache_info_class(self.hits, self.misses, self.stores)
+
+
+if __name__ == '__main__':
+
+    from lib.ssl_provider import GetResponse
+
+    GetResponse.http_cache = HttpCache(tempfile.mkdtemp())
+    url = 'http://blog.lan/entry/9/?text=1'
+    for _ in range(2):
+        resp = GetResponse(url).process()
+        print(type(resp).__name__, resp.status, len(resp.read()))
+        resp.close()
+    print(GetResponse.http_cache.info())
+
+    # Result should be like
+    # CachingResponse 200 ...
+    # CachedResponse 200 ...
+    # HttpCacheInfo(hits=1, misses=1, stores=1)
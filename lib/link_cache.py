@@ -0,0 +1,143 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: lib
+# File: link_cache.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+"""
+    Results of link checking that are kept between runs and bounded in-memory storage for them
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from time import time
+
+
+class LRUDict(MutableMapping):
+    """
+        Dictionary that keeps only 'maxsize' last used items
+    """
+
+    def __init__(self, maxsize=None, *args, **kwargs) -> None:
+        self.maxsize = maxsize
+        self.__items = OrderedDict()
+        super().__init__()
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        value = self.__items[key]
+        self.__items.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.__items[key] = value
+        self.__items.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self.__items) > self.maxsize:
+                self.__items.popitem(last=False)
+
+    def __delitem__(self, key):
+        del self.__items[key]
+
+    def __contains__(self, key):
+        return key in self.__items
+
+    def __iter__(self):
+        return iter(self.__items)
+
+    def __len__(self):
+        return len(self.__items)
+
+    def clear(self):
+        self.__items.clear()
+
+
+class LinkCheckCache:
+    """
+        SQLite storage of (status, reason) of checked urls with time of checking.
+        Result is actual during TTL (sec) that depends on the class of status (status // 100),
+        class 0 is used for errors when server did not respond.
+
+        Common usages
+            cache = LinkCheckCache('links_cache.sqlite', {2: 86400, 4: 3600})
+            cache.get(url) - (status, reason) or None if there is no actual result
+            cache.put(url, (status, reason))
+            cache.close()
+    """
+
+    ttl = {
+        0: 600,
+        2: 7 * 86400,
+        3: 86400,
+        4: 3600,
+        5: 600,
+    }
+    """
+        TTL (sec) by status class, if class is absent then result will not be used from cache
+    """
+
+    commit_every = 100
+
+    def __init__(self, file, ttl=None) -> None:
+        self.file = file
+        if ttl is not None:
+            self.ttl = {**self.ttl, **ttl}
+        self.__lock = threading.Lock()
+        self.__uncommitted = 0
+        self.__db = sqlite3.connect(self.file, check_same_thread=False)
+        self.__db.execute(
+            'CREATE TABLE IF NOT EXISTS links (url TEXT PRIMARY KEY, status INTEGER, reason TEXT, checked_at REAL)'
+        )
+        super().__init__()
+
+    def get(self, url, now=None):
+        with self.__lock:
+            row = self.__db.execute('SELECT status, reason, checked_at FROM links WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+
+        status, reason, checked_at = row
+        ttl = self.ttl.get(status // 100)
+        if ttl is None or (time() if now is None else now) - checked_at > ttl:
+            return None
+        return status, reason
+
+    def put(self, url, result, now=None):
+        status, reason = result
+        with self.__lock:
+            self.__db.execute('INSERT OR REPLACE INTO links (url, status, reason, checked_at) VALUES (?, ?, ?, ?)',
+                              (url, int(status), str(reason), time() if now is None else now))
+            self.__uncommitted += 1
+            if self.__uncommitted >= self.commit_every:
+                self.__db.commit()
+                self.__uncommitted = 0
+
+    def flush(self):
+        with self.__lock:
+            if self.__uncommitted:
+                self.__db.commit()
+                self.__uncommitted = 0
+
+    def close(self):
+        self.flush()
+        self.__db.close()
+
+
+if __name__ == '__main__':
+
+    lru = LRUDict(2)
+    lru['a'], lru['b'] = (1, 2)
+    lru['a']
+    lru['c'] = 3
+    print(dict(lru))
+    # Result should be
+    # {'a': 1, 'c': 3}
+
+    cache = LinkCheckCache(':memory:')
+    cache.put('https://blog.lan/', (200, 'OK'), now=0)
+    cache.put('https://blog.lan/missing', (404, 'Not Found'), now=0)
+    print(cache.get('https://blog.lan/', now=7200), cache.get('https://blog.lan/missing', now=7200))
+    # Result should be
+    # (200, 'OK') None
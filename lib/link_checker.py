@@ -5,15 +5,20 @@
 # Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
 # Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
 
+import asyncio
 import re
+from collections import defaultdict
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from http.client import HTTPResponse
-from urllib.error import URLError
+from urllib.error import URLError, HTTPError
 from urllib.parse import urlparse, urlunparse, quote, parse_qsl, urlencode
 from urllib.request import Request
 
-from lib.ssl_provider import GetResponse
+from lib.ssl_provider import GetResponse, transfer_statistics
 from lib.grabber import LinksGrabber
+from lib.link_cache import LRUDict
+from lib.scheduler import CircuitBreaker
 
 
 class LinkCheckerBase:
@@ -31,6 +36,32 @@ class LinkCheckerBase:
 
     link_grabber_class = LinksGrabber
 
+    concurrency = 1
+    """
+        If it is greater than 1 then links are checked by asyncio engine - up to 'concurrency' links
+        at same time, but not more than 'per_host_concurrency' for each host.
+        Results are processed (stored, logged) in same order as links are returned by link_grabber.
+    """
+
+    per_host_concurrency = 4
+
+    checked_urls_maxsize = 100000
+    """
+        checked_urls keeps only this number of last checked urls, None - unbounded
+    """
+
+    link_cache = None
+    """
+        LinkCheckCache (lib/link_cache.py) instance - results of previous runs are taken from it
+        while they are actual (TTL), so only new and expired urls are requested
+    """
+
+    circuit_breaker_class = CircuitBreaker
+    """
+        Links of a host that failed on connection level (timeout, refused, DNS ...)
+        CircuitBreaker.threshold times in a row are failed immediately without requests, None - disabled
+    """
+
     def __init__(self, link_grabber=None, grabber_start_url=''):
         """
             grabber_start_url will be used at instantiation
@@ -40,7 +71,10 @@ class LinkCheckerBase:
         self.grabber_start_url = grabber_start_url
         self.link_grabber = link_grabber
         # __checked_urls is dict where key is url and value is response's (status, reason) 2-tuple
-        self.__checked_urls = {}
+        self.__checked_urls = LRUDict(self.checked_urls_maxsize)
+        # results of requests that were made by asyncio engine before _check_url(...) was called
+        self.__prefetched = {}
+        self.circuit_breaker = self.circuit_breaker_class() if self.circuit_breaker_class is not None else None
         super().__init__()
 
     @property
@@ -121,6 +155,33 @@ class LinkCheckerBase:
             result = self.checked_urls.get(url, (0, 'looks like processed, but - ERROR'))
             return (result[0], result[1]+' - Checked already'), None
 
+        result, resp = self._request_url(url)
+        self.checked_urls[url] = result
+
+        return result, resp
+
+    def _request_url(self, url):
+        """
+            It makes request to url (if it was not made by asyncio engine already)
+
+            @returns 2-tuple ((status, reason), Response object)
+        """
+        if url in self.__prefetched:
+            return self.__prefetched.pop(url)
+
+        if self.link_cache is not None:
+            result = self.link_cache.get(url)
+            if result is not None:
+                return result, None
+
+        host = urlparse(url).netloc
+        breaker = self.circuit_breaker if host else None
+        if breaker is not None and not breaker.allow(host):
+            return (0, 'Circuit breaker is open: host {} failed {} times in a row'.format(
+                host, breaker.failures(host)
+            )), None
+
+        is_failed = False
         try:
             resp = GetResponse(Request(url, method='HEAD')).process()
             if isinstance(resp, HTTPResponse):
@@ -134,13 +195,77 @@ class LinkCheckerBase:
         except URLError as err:
             # if connection wrong, server does not exists
             resp, result = (None, (0, err.reason))
+            is_failed = not isinstance(err, HTTPError) and isinstance(err.reason, OSError)
         else:
             result = (resp.status, resp.reason)
+            # body is not needed, status and reason stay available
+            resp.close()
 
-        self.checked_urls[url] = result
+        if breaker is not None:
+            breaker.record(host, is_failed)
+        if self.link_cache is not None:
+            self.link_cache.put(url, result)
 
         return result, resp
 
+    def _iter_links(self):
+        """
+            It yields 2-tuple (url, page_url) for each link of self.link_grabber that should be checked
+        """
+        for url in self.__link_grabber:
+            _url = self.process_url(url)
+            if not _url:
+                continue
+            yield _url, getattr(self.__link_grabber, 'current_start_url', None)
+
+    async def _aprocess_urls(self):
+        """
+            Asyncio engine of _process_urls. Blocking requests are made in threads (self.concurrency),
+            links are grabbed in own thread, because grabber requests pages too. Each new link is requested
+            as soon as limits allow it, but _check_url(...) is called in order of links, thus
+            'checked_urls', 'isprocessed' and logging work same as in serial mode.
+        """
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(self.concurrency)
+        grabber_executor = ThreadPoolExecutor(1)
+        limit = asyncio.Semaphore(self.concurrency)
+        host_limits = defaultdict(lambda: asyncio.Semaphore(self.per_host_concurrency))
+        # bounded queue keeps number of requests, that are done ahead of _check_url, limited
+        queue = asyncio.Queue(maxsize=self.concurrency * 4)
+
+        async def request(url):
+            async with limit, host_limits[urlparse(url).netloc]:
+                return await loop.run_in_executor(executor, self._request_url, url)
+
+        async def produce():
+            links, requested = (self._iter_links(), set())
+            while True:
+                link = await loop.run_in_executor(grabber_executor, next, links, None)
+                if link is None:
+                    break
+                task = None
+                if link[0] not in requested:
+                    requested.add(link[0])
+                    task = asyncio.ensure_future(request(link[0]))
+                await queue.put((link, task))
+            await queue.put(None)
+
+        async def consume():
+            while (item := await queue.get()) is not None:
+                (url, page_url), task = item
+                if url in self.checked_urls:
+                    self._check_url(url, page_url, True)
+                    continue
+                self.__prefetched[url] = await (task or request(url))
+                self._check_url(url, page_url)
+
+        try:
+            await asyncio.gather(produce(), consume())
+        finally:
+            self.__prefetched.clear()
+            executor.shutdown(wait=False, cancel_futures=True)
+            grabber_executor.shutdown(wait=False, cancel_futures=True)
+
     def _process_urls(self):
         """
             Iterate over self.link_grabber and on each link on page
@@ -150,17 +275,23 @@ class LinkCheckerBase:
             but defined by self.link_provider. As rule It is descendant ContentSelector
         """
         self.checked_urls.clear()
-        for url in self.__link_grabber:
-            _url = self.process_url(url)
-            if not _url:
-                continue
-
-            params = [_url, getattr(self.__link_grabber, 'current_start_url', None)]
-            if _url in self.checked_urls:
-                # url was processed
-                params.append(True)
-
-            self._check_url(*params)
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.clear()
+        try:
+            if self.concurrency > 1:
+                asyncio.run(self._aprocess_urls())
+                return self
+
+            for _url, page_url in self._iter_links():
+                params = [_url, page_url]
+                if _url in self.checked_urls:
+                    # url was processed
+                    params.append(True)
+
+                self._check_url(*params)
+        finally:
+            if self.link_cache is not None:
+                self.link_cache.flush()
         return self
 
     def check(self):
@@ -191,7 +322,11 @@ class LoggedLinkCheckerMixin:
 
     def _process_urls(self):
         self.__current_page = None
-        return super()._process_urls()
+        result = super()._process_urls()
+        print('Compressed transfer info:', transfer_statistics.info())
+        if GetResponse.scheduler is not None:
+            print('Requests scheduler info:', GetResponse.scheduler.info())
+        return result
 
 
 class LoggedLinkCheckerBase(LoggedLinkCheckerMixin, LinkCheckerBase):
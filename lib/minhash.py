@@ -0,0 +1,179 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: lib
+# File: minhash.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+"""
+    MinHash signatures and LSH index that allow to find candidates
+    for expensive comparison (like DiffContent) without comparing everything with everything
+"""
+import hashlib
+from collections import defaultdict
+
+
+class MinHash:
+    """
+        One permutation MinHash over word shingles of normalized text.
+        Each shingle is hashed only once, the hash picks a bin (one of num_perm)
+        and the rest of hash is a value for min(). Empty bins are filled from the nearest
+        non-empty bin to the right (rotation densification). Thus, the signature can be used
+        for LSH banding same as classic MinHash with num_perm hash functions.
+
+        Common usages
+            sig_a = MinHash(text_a)
+            sig_b = MinHash(text_b)
+            sig_a.jaccard(sig_b) - estimated Jaccard similarity of word shingles [0.0 - 1.0]
+    """
+
+    num_perm = 64
+
+    shingle_size = 3
+
+    def __init__(self, text, num_perm=None, shingle_size=None) -> None:
+        if num_perm is not None:
+            self.num_perm = int(num_perm)
+        if shingle_size is not None:
+            self.shingle_size = int(shingle_size)
+        if self.num_perm < 1 or self.shingle_size < 1:
+            raise ValueError('num_perm and shingle_size should be positive integers')
+        self.signature = self._get_signature(self.shingles(text))
+        super().__init__()
+
+    def shingles(self, text):
+        words = str(text).split()
+        size = self.shingle_size
+        if len(words) <= size:
+            return {' '.join(words)} if words else set()
+        return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+    def _get_signature(self, shingles):
+        num_perm = self.num_perm
+        bins = [None] * num_perm
+        for shingle in shingles:
+            h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'little')
+            i, val = (h % num_perm, h // num_perm)
+            if bins[i] is None or val < bins[i]:
+                bins[i] = val
+
+        # rotation densification, if text is empty then all bins will be -1
+        filled = [i for i, val in enumerate(bins) if val is not None]
+        if not filled:
+            return tuple([-1] * num_perm)
+        for i in range(num_perm):
+            if bins[i] is None:
+                # nearest filled bin to the right (circular), offset keeps
+                # values from different bins distinguishable
+                j = next((f for f in filled if f > i), filled[0])
+                bins[i] = bins[j] + (j - i) % num_perm * (1 << 60)
+        return tuple(bins)
+
+    def jaccard(self, other):
+        if len(self.signature) != len(other.signature):
+            raise ValueError('Signatures should have same length (num_perm)')
+        return sum(1 for a, b in zip(self.signature, other.signature) if a == b) / len(self.signature)
+
+
+class MinHashLSH:
+    """
+        LSH index over MinHash signatures. The signature is split into 'bands' of 'rows'
+        (bands * rows == num_perm). Two texts become candidates if at least one band is equal.
+        More bands (less rows) - more candidates, better recall and slower.
+        Less bands (more rows) - less candidates, worse recall and faster.
+
+        Common usages
+            index = MinHashLSH(bands=16)
+            for file, content in files_content.items():
+                index.add(file, content)
+            index.query(post_content, 5) - list of 5 keys that look like most similar to post_content
+            index.remove(file) - excludes key from following queries
+    """
+
+    minhash_class = MinHash
+
+    bands = 16
+
+    exhaustive = True
+    """
+        If LSH buckets return less than 'limit' candidates then query will add
+        best candidates from the whole index (it compares signatures only, so it is cheap)
+    """
+
+    def __init__(self, bands=None, num_perm=None, shingle_size=None) -> None:
+        if bands is not None:
+            self.bands = int(bands)
+        self.num_perm = num_perm or self.minhash_class.num_perm
+        self.shingle_size = shingle_size or self.minhash_class.shingle_size
+        if self.bands < 1 or self.num_perm % self.bands:
+            raise ValueError('num_perm ({}) should be divisible by bands ({})'.format(self.num_perm, self.bands))
+        self.rows = self.num_perm // self.bands
+        self.__signatures = {}
+        self.__buckets = [defaultdict(set) for _ in range(self.bands)]
+        super().__init__()
+
+    def __len__(self):
+        return len(self.__signatures)
+
+    def __contains__(self, key):
+        return key in self.__signatures
+
+    def minhash(self, text):
+        return self.minhash_class(text, self.num_perm, self.shingle_size)
+
+    def _bands(self, minhash):
+        sig, rows = (minhash.signature, self.rows)
+        return (sig[i * rows:(i + 1) * rows] for i in range(self.bands))
+
+    def add(self, key, text):
+        if key in self.__signatures:
+            self.remove(key)
+        minhash = text if isinstance(text, MinHash) else self.minhash(text)
+        self.__signatures[key] = minhash
+        for bucket, band in zip(self.__buckets, self._bands(minhash)):
+            bucket[band].add(key)
+        return self
+
+    def remove(self, key):
+        minhash = self.__signatures.pop(key, None)
+        if minhash is not None:
+            for bucket, band in zip(self.__buckets, self._bands(minhash)):
+                keys = bucket.get(band)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del bucket[band]
+        return self
+
+    def query(self, text, limit=None):
+        """
+            Returns keys ordered by estimated similarity (most similar first).
+            If limit is None then all candidates from LSH buckets will be returned.
+        """
+        minhash = text if isinstance(text, MinHash) else self.minhash(text)
+        candidates = set()
+        for bucket, band in zip(self.__buckets, self._bands(minhash)):
+            candidates.update(bucket.get(band, ()))
+
+        if self.exhaustive and limit is not None and len(candidates) < limit:
+            candidates = self.__signatures.keys()
+
+        # sorting by key on equal similarity makes result independent of the set's order
+        ranked = sorted(candidates, key=lambda key: (-minhash.jaccard(self.__signatures[key]), str(key)))
+        return ranked if limit is None else ranked[:limit]
+
+
+if __name__ == '__main__':
+
+    texts = {
+        'a': 'The quick brown fox jumps over the lazy dog near the river bank',
+        'b': 'The quick brown fox jumps over the lazy cat near the river bank',
+        'c': 'Completely different text about OpenSSL config files and certificates',
+    }
+    index = MinHashLSH(bands=32)
+    for key, text in texts.items():
+        index.add(key, text)
+
+    print(index.query('The quick brown fox jumps over the lazy dog near the river', 2))
+    # Result should be like
+    # ['a', 'b']
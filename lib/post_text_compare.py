@@ -12,17 +12,24 @@ import sys
 import lxml.html
 import lxml.etree
 import json
+import multiprocessing
+import os
 
 from json.decoder import JSONDecodeError
 from time import sleep
 from timeit import Timer
-from collections import namedtuple
+from collections import namedtuple, Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from os.path import isfile, basename
 
+from lib.content_cache import ContentCache
 from lib.file_provider import GetFiles
-from lib.grabber import LinksGrabber, ContentSelector
+from lib.grabber import LinksGrabber, ContentSelector, get_content_md5
 from lib.html_tools import DiffContent, NormalizeContent
-from lib.ssl_provider import GetResponse
+from lib.minhash import MinHashLSH
+from lib.similarity import NgramVectorizer, assign
+from lib.ssl_provider import GetResponse, transfer_statistics
+from lib.urlcanon import UrlCanonicalizer
 
 
 class TextsLinksProvider(ContentSelector):
@@ -31,6 +38,9 @@ class TextsLinksProvider(ContentSelector):
     """
     selector = 'article.card section.card-body.entry-text div.body-text a.btn'
 
+    # PagerProvider takes same content, the pager is in div.body_content too
+    incremental_container = 'div.body_content'
+
 
 class PagerProvider(ContentSelector):
     """
@@ -41,19 +51,105 @@ class PagerProvider(ContentSelector):
 
 class TextLinksGrabber(LinksGrabber):
     """
-        It can duplicate text's links due to 'https://test.blog.lan/' and 'https://test.blog.lan/?page=1'
-        can be same pages as for server but grabber counts this links as different.
-        It can be fixed if a start url will be 'https://test.blog.lan/?page=1'. In other words,
-        like url for first page in pager.
+        'https://test.blog.lan/' and 'https://test.blog.lan/?page=1' are same page of pager,
+        so the page is not requested twice and text's links are not duplicated
     """
     link_provider_class = TextsLinksProvider
     page_provider_class = PagerProvider
 
+    url_canonicalizer = UrlCanonicalizer(default_params={'page': '1'})
+
+    # only urls are needed, TextsLinksProvider selects <a> only
+    attribute_mode = True
+
 
 class BodyTextSelector(ContentSelector):
+    # whole page is parsed (no incremental_container), thus _get_url_content can check that the text is only one
     selector = 'article.card section.card-body.entry-text div.body-text'
 
 
+class BestMatchFinder:
+    """
+        Searches the file which content is most similar to post's text.
+        It has no links on PostTextsComparer, so it can be passed into process pool's workers.
+        Results are plain tuples (url, file, ratio, diff) that are suitable for PostTextsComparer.relation_item_class
+
+        Full ratio() is computed only for files that still can beat the best one so far and ratio_limit.
+        Cheap upper bounds are tested before - DiffContent.length_ratio() then DiffContent.quick_ratio().
+        The diff is computed for the best file only. 'statistics' counts how many files were skipped on each step.
+    """
+
+    ratio_limit = 0
+
+    granularity = None
+    """
+        granularity of DiffContent, None - DiffContent.granularity
+    """
+
+    def __init__(self, ratio_limit=None, granularity=None) -> None:
+        if ratio_limit is not None:
+            self.ratio_limit = ratio_limit
+        if granularity is not None:
+            self.granularity = granularity
+        self.statistics = Counter()
+        super().__init__()
+
+    def compare(self, url, file, a, b):
+        diff = DiffContent(a=a, b=b, granularity=self.granularity)
+        diff_res = diff.compare()
+        return url, file, diff.ratio(), diff_res
+
+    def __call__(self, url, a, files, get_content):
+        stat = self.statistics
+        max_ratio, max_file, max_diff = (None, None, None)
+        for file in files:
+            stat['candidates'] += 1
+            diff = DiffContent(a=a, b=get_content(file), granularity=self.granularity)
+            # ratio should be greater than both of them to be the best one
+            threshold = self.ratio_limit if max_ratio is None else max(max_ratio, self.ratio_limit)
+            if diff.length_ratio() <= threshold:
+                stat['skipped_by_length_ratio'] += 1
+                continue
+            if diff.quick_ratio() <= threshold:
+                stat['skipped_by_quick_ratio'] += 1
+                continue
+
+            stat['full_ratio'] += 1
+            ratio = diff.ratio()
+            if ratio > threshold:
+                max_ratio, max_file, max_diff = (ratio, file, diff)
+            if max_ratio == 1:
+                break
+
+        if max_diff is None:
+            return None
+
+        stat['full_diff'] += 1
+        return url, max_file, max_ratio, max_diff.compare()
+
+
+_best_match_worker = {}
+
+
+def _init_best_match_worker(finder, files_content):
+    _best_match_worker['finder'] = finder
+    _best_match_worker['files_content'] = files_content
+
+
+def _best_match_task(url, a, files):
+    """
+        It is executed in worker process. ComparisonResult and RelationItem are not picklable
+        (classes are created inside of other classes), thus the result is a plain tuple with plain tuples in diff.
+        Statistics of the finder are returned for each task separately.
+    """
+    finder = _best_match_worker['finder']
+    finder.statistics.clear()
+    best = finder(url, a, files, _best_match_worker['files_content'].__getitem__)
+    if best is not None:
+        best = (*best[:3], [tuple(dif) for dif in best[3]])
+    return best, finder.statistics
+
+
 class PostTextsComparer:
     """
         'https://blog.lan/?page=1'
@@ -61,13 +157,103 @@ class PostTextsComparer:
 
     relations_file_name = 'relations.txt'
 
+    relations_journal_suffix = '.part'
+    """
+        If relations file is JSON Lines (.jsonl) then compare() appends each decided relation
+        into relations file name + this suffix immediately. Next run after crash continues from it.
+        When comparison is finished the journal replaces relations file.
+    """
+
     ratio_limit = 0.75
 
-    relation_item_class = namedtuple('RelationItem', ['url', 'file', 'ratio', 'diff'], defaults=('', '', 0, []))
+    diff_granularity = None
+    """
+        What is compared 'chars', 'words' or 'sentences' (see DiffContent), None - DiffContent.granularity
+    """
+
+    candidates_limit = None
+    """
+        If it is set then each url, that has no relation to a file, will be compared
+        only with 'candidates_limit' most similar files from MinHash/LSH index (top-k)
+        instead of all files. Less value - faster, but a chance to miss the right file is higher.
+        In 'assignment' match_mode only these pairs are estimated by similarity.
+    """
+
+    candidates_index_class = MinHashLSH
+
+    match_mode = 'greedy'
+    """
+        How urls, that have no relations, are matched with files
+            'greedy' - each url (in order) takes the best file from files that are not taken yet
+            'assignment' - optimal one-to-one assignment over similarity of TF-IDF n-gram vectors
+                of urls and files (see similarity.assign), DiffContent is computed only for assigned pairs
+    """
+
+    assignment_min_similarity = 0.1
+    """
+        Pairs with cosine similarity less or equal to this value are not compared (url has not related file)
+    """
+
+    vectorizer_class = NgramVectorizer
+
+    best_match_finder_class = BestMatchFinder
+
+    jobs = 1
+    """
+        Number of worker processes for comparison of urls, that have no relations, with files
+    """
+
+    fetch_workers = 4
+    """
+        Number of threads that fetch (and normalize) post's texts in background while comparison runs.
+        If it is less than 2 then each post will be fetched at time when it is needed.
+    """
+
+    fetch_lookahead = 32
+    """
+        Maximal number of post's texts that are fetched ahead of comparison, so memory does not grow
+        with number of posts on the site
+    """
+
+    fetch_timeout = None
+    """
+        Timeout (sec) of each request of post's text, None - default socket timeout
+    """
+
+    file_content_cache_class = ContentCache
+
+    file_content_cache_size = None
+    """
+        Maximum of normalized files that are kept in memory, None - all files. Each url is compared
+        with files in same order, so a cache that is smaller than the set of files parses files again for each url.
+    """
+
+    file_content_cache_file = None
+    """
+        If it is set then normalized content of files also will be stored in this SQLite file,
+        so the next runs will not parse not changed files at all.
+    """
+
+    candidates_index_bands = None
+    """
+        Number of LSH bands, if None then candidates_index_class.bands will be used.
+        More bands - better recall, but more candidates to rank.
+    """
+
+    relation_item_class = namedtuple('RelationItem',
+                                     ['url', 'file', 'ratio', 'diff', 'url_md5', 'file_md5', 'params_md5'],
+                                     defaults=('', '', 0, [], '', '', ''))
 
     def __init__(self, start_url, files_dir, relations_file_name=None) -> None:
         self.__relations = []
         self.__relations_file_name = relations_file_name or self.relations_file_name
+        self.__file_content_cache = None
+        self.__fetcher = None
+        self.__url_contents = {}
+        self.__kept_url_contents = {}
+        self.__pending_urls = deque()
+        self.__statistics = Counter()
+        self.__journal = None
         self.load_relations(self.__relations_file_name)
         self.start_url = start_url
         self.files_dir = files_dir
@@ -77,6 +263,25 @@ class PostTextsComparer:
     def relation_file_name(self):
         return self.__relations_file_name
 
+    @property
+    def is_jsonl(self):
+        """
+            Relations file is in JSON Lines format (one relation per line) that is streamed on reading
+        """
+        return self.__relations_file_name.endswith('.jsonl')
+
+    @property
+    def relations_journal_file_name(self):
+        return self.__relations_file_name + self.relations_journal_suffix
+
+    @property
+    def file_content_cache(self):
+        if self.__file_content_cache is None:
+            self.__file_content_cache = self.file_content_cache_class(
+                self.file_content_cache_size, self.file_content_cache_file
+            )
+        return self.__file_content_cache
+
     def urls(self):
         return set(TextLinksGrabber(self.start_url))
 
@@ -97,17 +302,61 @@ class PostTextsComparer:
             { 'url': 'http://some.site/url/path?query=string',
               'file': '/some/path/to/file.html',
               'ratio': [0.0 - 1.0],
-              'diff': [('insert', 'some content'), ('replace', 'some content'), ('delete', 'some content')]
+              'diff': [('insert', 'some content'), ('replace', 'some content'), ('delete', 'some content')],
+              'url_md5': 'fingerprint (get_content_md5) of normalized post's text',
+              'file_md5': 'fingerprint (get_content_md5) of normalized file's content',
+              'params_md5': 'fingerprint of comparison parameters (see comparison_params())'
             }
             'url' can be empty in same time when 'file' exists - file, probably, have not related content on site.
              Or, same but from other side, url have not content that correlates to anyone of files.
             'file' did not present but 'url' exists - same as above but in reversed meaning
+            If fingerprints of the url, the file and comparison parameters are same on next comparison then
+            'ratio' and 'diff' will be reused without comparison.
+            For JSON Lines file whole file will be loaded in memory, iter_relations() does not do it.
         """
+        if self.__relations is None:
+            return list(self.iter_relations())
         return self.__relations
 
+    def iter_relations(self):
+        """
+            Same as relations, but JSON Lines file is read line by line
+        """
+        if self.__relations is None:
+            yield from self._read_jsonl(self.__relations_file_name)
+        else:
+            yield from self.__relations
+
+    def _read_jsonl(self, file, ignore_broken_tail=False):
+        """
+            If ignore_broken_tail is True then the last line that can't be decoded will be skipped.
+            It can be written partially if process was killed.
+        """
+        with open(file, mode='r') as fd:
+            line = fd.readline()
+            lineno = 1
+            while line:
+                next_line = fd.readline()
+                if line.strip():
+                    try:
+                        item = json.loads(line)
+                    except JSONDecodeError as err:
+                        if ignore_broken_tail and not next_line:
+                            break
+                        err.args = (err.args[0] + '. File "{}", line {}'.format(file, lineno), *err.args[1:])
+                        raise err
+                    yield self.relation_item_class(*item)
+                line = next_line
+                lineno += 1
+
     def load_relations(self, file):
         if isfile(file):
             self.__relations_file_name = file
+            if self.is_jsonl:
+                # it will be streamed on demand
+                self.__relations = None
+                return self
+
             with open(self.__relations_file_name, mode='r') as fd:
                 try:
                     self.__relations = [self.relation_item_class(*item) for item in json.load(fd)]
@@ -117,8 +366,50 @@ class PostTextsComparer:
 
         return self
 
+    def _start_relations_journal(self, params_md5=None):
+        """
+            It returns relations that were decided by interrupted comparison (if they are)
+            and opens journal for appending new ones. If params_md5 is passed then relations
+            decided with other parameters are dropped.
+        """
+        if not self.is_jsonl:
+            return []
+
+        file = self.relations_journal_file_name
+        resumed = list(self._read_jsonl(file, True)) if isfile(file) else []
+        if params_md5 is not None:
+            resumed = [item for item in resumed if item.params_md5 == params_md5]
+        # rewriting drops a broken tail
+        self.__journal = open(file, mode='w')
+        for item in resumed:
+            self.__journal.write(json.dumps(item) + "\n")
+        self.__journal.flush()
+        return resumed
+
+    def _write_relations_journal(self, item):
+        if self.__journal is not None:
+            self.__journal.write(json.dumps(item) + "\n")
+            self.__journal.flush()
+
+    def _stop_relations_journal(self, is_finished):
+        if self.__journal is not None:
+            self.__journal.close()
+            self.__journal = None
+            if is_finished:
+                os.replace(self.relations_journal_file_name, self.__relations_file_name)
+                # the relations file is actual now, it will be streamed from
+                self.__relations = None
+
     def dump_relations(self):
-        if self.relations:
+        if self.__relations is None:
+            # JSON Lines file was written by compare() or loaded without changes
+            return
+
+        if self.is_jsonl:
+            with open(self.__relations_file_name, mode='w') as fd:
+                for rel in self.__relations:
+                    fd.write(json.dumps(rel) + "\n")
+        elif self.relations:
             indent = ' '*4
             with open(self.__relations_file_name, mode='w') as fd:
                 fd.write("[\n")
@@ -132,65 +423,295 @@ class PostTextsComparer:
                 fd.write("]".format(indent))
 
     @staticmethod
-    def _get_url_content(url) -> str:
-        content = GetResponse(url).process()
+    def _get_url_content(url, timeout=None) -> str:
+        content = GetResponse(url, timeout=timeout).process()
         res_el = tuple(BodyTextSelector(content))
+        content.close()
         if len(res_el) != 1:
             raise ValueError('Something went wrong. Post\'s text should be exact one.')
         return str(NormalizeContent(res_el[0]))
 
     @staticmethod
-    def _get_file_content(file) -> str:
+    def _read_file_content(file) -> str:
         with open(file, mode='r', encoding='utf8') as fd:
             res_str = str(NormalizeContent(lxml.html.parse(fd).getroot().body))
         return res_str
 
-    def compare(self):
-        urls = self.urls()
-        files = self.files()
+    def _get_file_content(self, file) -> str:
+        # content normalized with other settings of NormalizeContent is not reused
+        version = get_content_md5(json.dumps(self.comparison_params()['normalization']))
+        return self.file_content_cache.get(file, self._read_file_content, version)
 
-        related_urls = {item.url: item.file for item in self.relations if item.file}
+    def _get_candidates_index(self, files):
+        index = self.candidates_index_class(bands=self.candidates_index_bands)
+        for file in files:
+            index.add(file, self._get_file_content(file))
+        return index
 
-        res_rel = []
+    def _prefetch_url_contents(self, urls):
+        """
+            It starts fetching of post's texts in background threads in order of urls,
+            at most 'fetch_lookahead' texts are fetched ahead of consumption.
+            _get_prefetched_url_content(url) waits for the result if it is not ready yet.
+        """
+        self._stop_prefetch()
+        if self.fetch_workers > 1:
+            self.__fetcher = ThreadPoolExecutor(self.fetch_workers)
+            self.__pending_urls.extend(urls)
+            self._fill_prefetch()
+
+    def _fill_prefetch(self):
+        while self.__pending_urls and len(self.__url_contents) < max(1, self.fetch_lookahead):
+            url = self.__pending_urls.popleft()
+            if url not in self.__url_contents and url not in self.__kept_url_contents:
+                self.__url_contents[url] = self.__fetcher.submit(self._get_url_content, url, self.fetch_timeout)
+
+    def _get_prefetched_url_content(self, url, keep=False) -> str:
+        """
+            Prefetched text is forgotten when it is taken. If keep is True then the text is kept
+            until it is taken again (without keep).
+        """
+        content = self.__kept_url_contents.pop(url, None)
+        if content is None:
+            future = self.__url_contents.pop(url, None)
+            if future is None:
+                if url in self.__pending_urls:
+                    # it is taken out of order, so it should not be fetched again later
+                    self.__pending_urls.remove(url)
+                content = self._get_url_content(url, self.fetch_timeout)
+            else:
+                content = future.result()
+                self._fill_prefetch()
+        if keep:
+            self.__kept_url_contents[url] = content
+        return content
+
+    def _stop_prefetch(self):
+        if self.__fetcher is not None:
+            self.__fetcher.shutdown(cancel_futures=True)
+            self.__fetcher = None
+        self.__url_contents.clear()
+        self.__kept_url_contents.clear()
+        self.__pending_urls.clear()
 
-        def _compare(a, b):
-            diff = DiffContent(a=a, b=b)
-            diff_res = diff.compare()
-            res_item = self.relation_item_class(url=url, file=file, ratio=diff.ratio(), diff=diff_res)
-            return res_item
+    @property
+    def statistics(self):
+        """
+            Counters of the best match search (see BestMatchFinder) for last comparison
+        """
+        return self.__statistics
 
-        # pass through urls that have relations to files
-        _urls = set(related_urls) & urls
-        for url in _urls:
-            file = related_urls.get(url)
-            if file:
-                res_item = _compare(self._get_url_content(url), self._get_file_content(file))
-                res_rel.append(res_item)
-                files.discard(file)
-
-        # pass through other urls that have not relations to files
-        urls = urls - _urls
+    def _get_best_match_finder(self):
+        return self.best_match_finder_class(self.ratio_limit, self.diff_granularity)
+
+    def _iter_best_matches(self, urls, files, index=None):
+        """
+            It yields (url, post's text, best match) for each url in order. Best match is a tuple
+            (url, file, ratio, diff) or None. Consumer can discard files from 'files'
+            (and index) between iterations - following urls will not be compared with them.
+        """
+        finder = self._get_best_match_finder()
         for url in urls:
-            max_item = None
-            a = self._get_url_content(url)
-            for file in files:
-                res_item = _compare(a, self._get_file_content(file))
-                if max_item is None or res_item.ratio > max_item.ratio:
-                    max_item = res_item
-                if max_item.ratio == 1:
+            a = self._get_prefetched_url_content(url)
+            candidates = sorted(files) if index is None else index.query(a, self.candidates_limit)
+            yield url, a, finder(url, a, candidates, self._get_file_content)
+            self.__statistics.update(finder.statistics)
+            finder.statistics.clear()
+
+    def _iter_best_matches_parallel(self, urls, files, index=None):
+        """
+            Same as _iter_best_matches, but comparisons are spread across a process pool (self.jobs workers).
+            At most 'fetch_lookahead' urls are submitted ahead of the url that is yielded, so memory does not
+            grow with number of urls and results are yielded (and journaled) while next ones are compared.
+            If a candidate was taken by the previous url (it is not in 'files' anymore) then best match
+            is searched again over the rest of files, so the result is same as for serial execution.
+        """
+        finder = self._get_best_match_finder()
+        files_content = {file: self._get_file_content(file) for file in files}
+        tasks = deque()
+        urls = iter(urls)
+        # workers are spawned, fork would copy locks that are held by prefetching threads at the moment
+        with ProcessPoolExecutor(self.jobs, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_best_match_worker, initargs=(finder, files_content)) as pool:
+            while True:
+                for url in urls:
+                    a = self._get_prefetched_url_content(url)
+                    candidates = sorted(files) if index is None else index.query(a, self.candidates_limit)
+                    tasks.append((url, a, candidates, pool.submit(_best_match_task, url, a, candidates)))
+                    if len(tasks) >= max(1, self.fetch_lookahead):
+                        break
+                if not tasks:
                     break
 
-            if max_item and max_item.ratio > self.ratio_limit:
-                res_rel.append(max_item)
-                files.discard(max_item.file)
-            else:
-                res_rel.append(self.relation_item_class(url=url))
+                url, a, candidates, future = tasks.popleft()
+                best, statistics = future.result()
+                self.__statistics.update(statistics)
+                if best is not None:
+                    best = (*best[:3], [DiffContent.comparison_result_class(*dif) for dif in best[3]])
+
+                if index is None:
+                    is_actual = best is None or best[1] in files
+                else:
+                    candidates, prev_candidates = (index.query(a, self.candidates_limit), candidates)
+                    is_actual = candidates == prev_candidates
+                if not is_actual:
+                    candidates = sorted(files) if index is None else candidates
+                    best = finder(url, a, candidates, self._get_file_content)
+                    self.__statistics.update(finder.statistics)
+                    finder.statistics.clear()
+                yield url, a, best
+
+    def _iter_assigned_matches(self, urls, files, index=None):
+        """
+            Same as _iter_best_matches, but files are assigned to urls all at once, thus result does not
+            depend on order of urls. If index is passed then each url is paired only with its candidates.
+        """
+        finder = self._get_best_match_finder()
+        files = sorted(files)
+        urls_content = [self._get_prefetched_url_content(url) for url in urls]
+        files_content = [self._get_file_content(file) for file in files]
+        candidates = None
+        if index is not None:
+            file_index = {file: j for j, file in enumerate(files)}
+            candidates = [[file_index[file] for file in index.query(a, self.candidates_limit)] for a in urls_content]
+        assigned = {
+            i: j for i, j, sim in assign(urls_content, files_content, self.assignment_min_similarity,
+                                         self.vectorizer_class(), candidates)
+        }
+        for i, url in enumerate(urls):
+            best = None
+            if i in assigned:
+                file = files[assigned[i]]
+                self.__statistics['full_diff'] += 1
+                best = finder.compare(url, file, urls_content[i], files_content[assigned[i]])
+            yield url, urls_content[i], best
+
+    def comparison_params(self):
+        """
+            Parameters that change ratio, diff or matching of urls and files. Stored results are reused
+            only if they were produced with same parameters.
+        """
+        return {
+            'ratio_limit': self.ratio_limit,
+            'granularity': self.diff_granularity or DiffContent.granularity,
+            'ignore_empty_differences': DiffContent.ignore_empty_differences,
+            'match_mode': self.match_mode,
+            'candidates_limit': self.candidates_limit,
+            'candidates_index_bands': self.candidates_index_bands,
+            'assignment_min_similarity': self.assignment_min_similarity,
+            'normalization': [NormalizeContent.block_tags, NormalizeContent.block_tag_prefix],
+        }
+
+    def _get_params_md5(self):
+        return get_content_md5(json.dumps(self.comparison_params(), sort_keys=True))
 
-        # add files that have no relations to urls
-        for file in files:
-            res_rel.append(self.relation_item_class(file=file))
+    def compare(self):
+        urls = self.urls()
+        files = self.files()
+        params_md5 = self._get_params_md5()
+
+        related_urls, unrelated_urls, unrelated_files = ({}, {}, {})
+        for item in self.iter_relations():
+            if item.url and item.file:
+                related_urls[item.url] = item
+            elif item.params_md5 != params_md5:
+                # urls and files without relation were decided by other parameters
+                continue
+            elif item.url:
+                unrelated_urls[item.url] = item.url_md5
+            elif item.file:
+                unrelated_files[item.file] = item.file_md5
+
+        finder = self._get_best_match_finder()
+        self.__statistics.clear()
+
+        # relations decided by interrupted comparison are not processed again
+        res_rel = self._start_relations_journal(params_md5)
+        urls -= {item.url for item in res_rel}
+        files -= {item.file for item in res_rel}
+
+        def add_relation(item):
+            item = item._replace(params_md5=params_md5)
+            res_rel.append(item)
+            self._write_relations_journal(item)
+
+        _urls = set(related_urls) & urls
+        urls = sorted(urls - _urls)
+        self._prefetch_url_contents([*sorted(_urls), *urls])
+        is_finished = False
+        try:
+            # pass through urls that have relations to files
+            for url in sorted(_urls):
+                rel = related_urls.get(url)
+                if rel:
+                    a = self._get_prefetched_url_content(url)
+                    b = self._get_file_content(rel.file)
+                    url_md5, file_md5 = (get_content_md5(a), get_content_md5(b))
+                    if (url_md5, file_md5, params_md5) == (rel.url_md5, rel.file_md5, rel.params_md5):
+                        # neither post nor file nor parameters were changed since last comparison
+                        res_item = (url, rel.file, rel.ratio, rel.diff)
+                    else:
+                        res_item = finder.compare(url, rel.file, a, b)
+                    add_relation(self.relation_item_class(*res_item, url_md5=url_md5, file_md5=file_md5))
+                    files.discard(rel.file)
+
+            # urls that had no relation on previous comparison and were not changed since. If the rest of
+            # files also had no relation and were not changed then search of best match will give same result
+            if unrelated_urls and all(
+                unrelated_files.get(file) == get_content_md5(self._get_file_content(file)) for file in files
+            ):
+                changed_urls = []
+                for url in urls:
+                    url_md5 = unrelated_urls.get(url)
+                    # text of changed url is needed again by the search of best match
+                    a = self._get_prefetched_url_content(url, keep=True)
+                    if url_md5 and url_md5 == get_content_md5(a):
+                        self._get_prefetched_url_content(url)
+                        add_relation(self.relation_item_class(url=url, url_md5=url_md5))
+                    else:
+                        changed_urls.append(url)
+                urls = changed_urls
+
+            # pass through other urls that have not relations to files
+            if self.match_mode not in ('greedy', 'assignment'):
+                raise ValueError('match_mode is {} but must be either "greedy" or "assignment"'.format(
+                    self.match_mode
+                ))
+
+            index = None
+            if self.candidates_limit and urls and files:
+                index = self._get_candidates_index(files)
+
+            iter_best_matches = self._iter_best_matches
+            if self.match_mode == 'assignment':
+                iter_best_matches = self._iter_assigned_matches
+            elif self.jobs > 1 and len(urls) > 1 and files:
+                iter_best_matches = self._iter_best_matches_parallel
+
+            for url, a, max_item in iter_best_matches(urls, files, index):
+                url_md5 = get_content_md5(a)
+                if max_item and max_item[2] > self.ratio_limit:
+                    file_md5 = get_content_md5(self._get_file_content(max_item[1]))
+                    add_relation(self.relation_item_class(*max_item, url_md5=url_md5, file_md5=file_md5))
+                    files.discard(max_item[1])
+                    if index is not None:
+                        index.remove(max_item[1])
+                else:
+                    add_relation(self.relation_item_class(url=url, url_md5=url_md5))
+
+            self._stop_prefetch()
+
+            # add files that have no relations to urls
+            for file in sorted(files):
+                file_md5 = get_content_md5(self._get_file_content(file))
+                add_relation(self.relation_item_class(file=file, file_md5=file_md5))
+            is_finished = True
+        finally:
+            self._stop_prefetch()
+            self.file_content_cache.flush()
+            self.__relations = res_rel
+            self._stop_relations_journal(is_finished)
 
-        self.__relations = res_rel
         return self
 
 
@@ -216,23 +737,36 @@ class LoggedPostTextsComparer(PostTextsComparer):
         print('Dumping relations....')
         super().dump_relations()
 
+    def _get_candidates_index(self, files):
+        print('Building candidates index....')
+        return super()._get_candidates_index(files)
+
+    def _iter_assigned_matches(self, urls, files, index=None):
+        print('Assigning files to urls by similarity matrix....')
+        yield from super()._iter_assigned_matches(urls, files, index)
+
     @staticmethod
-    def _get_url_content(url) -> str:
+    def _get_url_content(url, timeout=None) -> str:
         print('Getting content of {}'.format(url))
-        return PostTextsComparer._get_url_content(url)
+        return PostTextsComparer._get_url_content(url, timeout)
 
     @staticmethod
-    def _get_file_content(file) -> str:
+    def _read_file_content(file) -> str:
         sys.stdout.write("Getting content of {}".format(file))
         sys.stdout.flush()
         sleep(LoggedPostTextsComparer.sleep_time_for_render)
-        result = PostTextsComparer._get_file_content(file)
+        result = PostTextsComparer._read_file_content(file)
         sys.stdout.write("\r{}".format(LoggedPostTextsComparer.ERASE_LINE))
         return result
 
     def compare(self):
         print('Starting comparison...')
         result = super().compare()
+        print('File usage cache info:', self.file_content_cache.info())
+        print('Best match search info:', dict(self.statistics))
+        print('Compressed transfer info:', transfer_statistics.info())
+        if GetResponse.scheduler is not None:
+            print('Requests scheduler info:', GetResponse.scheduler.info())
         return result
 
 
@@ -18,6 +18,8 @@ class TextLinkSelector(ContentSelector):
     selector = 'div.body_content article section.card-body.entry-text img[src], '\
                'div.body_content article section.card-body.entry-text a[href]'
 
+    incremental_container = 'div.body_content'
+
 
 class PostTextLinkChecker(LinkChecker):
 
@@ -0,0 +1,262 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: lib
+# File: scheduler.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+"""
+    Per host rate and concurrency limits of outgoing requests which adapt to the host's behaviour
+"""
+import threading
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from time import monotonic, sleep, time
+
+
+class HostState:
+    """
+        Current limits of one host, it is changed under 'condition' only
+    """
+
+    def __init__(self, rate, concurrency) -> None:
+        self.condition = threading.Condition()
+        self.rate = rate
+        self.concurrency = concurrency
+        self.active = 0
+        self.next_time = 0.0
+        self.blocked_until = 0.0
+        self.latency = None
+        super().__init__()
+
+
+class HostScheduler:
+    """
+        Each request to a host has to acquire a slot before it is sent and release it with observed
+        latency and status when response (headers) is received.
+
+        rate - requests per second for each host at start, None or 0 - unlimited
+        concurrency - requests of one host at same time at start
+
+        Limits are adapted for each host
+            latency (EWMA) is less than target_latency - rate is increased by rate_step (up to max_rate)
+                and concurrency by 1 (up to max_concurrency)
+            latency is greater than target_latency - rate is multiplied by slowdown_factor (down to min_rate)
+            status 429 or 503 - rate and concurrency are halved, requests of the host are postponed
+                on Retry-After seconds (or 'default_retry_after' if header is absent, max_retry_after at most)
+
+        Common usages
+            scheduler = HostScheduler(rate=5, concurrency=2)
+            scheduler.acquire('blog.lan')
+            ... request ...
+            scheduler.release('blog.lan', latency, status, headers)
+            scheduler.info() - SchedulerInfo(requests=..., wait_time=..., max_wait=..., throttled=...)
+    """
+
+    rate = 20.0
+
+    min_rate = 0.2
+
+    max_rate = 100.0
+
+    rate_step = 1.0
+
+    concurrency = 4
+
+    max_concurrency = 8
+
+    target_latency = 1.0
+
+    slowdown_factor = 0.8
+
+    latency_weight = 0.3
+
+    throttle_statuses = (429, 503)
+
+    default_retry_after = 5.0
+
+    max_retry_after = 300.0
+
+    scheduler_info_class = namedtuple('SchedulerInfo', ['requests', 'wait_time', 'max_wait', 'throttled'])
+
+    def __init__(self, rate=None, concurrency=None) -> None:
+        if rate is not None:
+            self.rate = rate
+        if concurrency is not None:
+            self.concurrency = int(concurrency)
+        self.__lock = threading.Lock()
+        self.__hosts = {}
+        self.requests = self.throttled = 0
+        self.wait_time = self.max_wait = 0.0
+        super().__init__()
+
+    def host_state(self, host):
+        with self.__lock:
+            state = self.__hosts.get(host)
+            if state is None:
+                state = self.__hosts[host] = HostState(self.rate, self.concurrency)
+            return state
+
+    def acquire(self, host):
+        """
+            Blocks until the host allows one more request, returns time (sec) spent in waiting
+        """
+        start = monotonic()
+        state = self.host_state(host)
+        with state.condition:
+            while state.active >= state.concurrency:
+                state.condition.wait()
+            state.active += 1
+            # a moment of sending is reserved, so next request will be sent 1 / rate later
+            now = monotonic()
+            send_time = max(now, state.next_time, state.blocked_until)
+            state.next_time = send_time + (1 / state.rate if state.rate else 0)
+
+        try:
+            if send_time > now:
+                sleep(send_time - now)
+        except BaseException:
+            # the slot is not used (KeyboardInterrupt ...), waiting requests should not wait for it
+            with state.condition:
+                state.active -= 1
+                state.condition.notify_all()
+            raise
+
+        wait = monotonic() - start
+        with self.__lock:
+            self.requests += 1
+            self.wait_time += wait
+            self.max_wait = max(self.max_wait, wait)
+        return wait
+
+    def _get_retry_after(self, headers):
+        value = headers.get('Retry-After') if headers is not None else None
+        if not value:
+            return self.default_retry_after
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time()
+            except (TypeError, ValueError):
+                delay = self.default_retry_after
+        return min(max(delay, 0.0), self.max_retry_after)
+
+    def release(self, host, latency, status=None, headers=None):
+        """
+            status is None if request failed without response
+        """
+        state = self.host_state(host)
+        with state.condition:
+            state.active -= 1
+            if status in self.throttle_statuses:
+                state.blocked_until = max(state.blocked_until, monotonic() + self._get_retry_after(headers))
+                state.rate = max(self.min_rate, (state.rate or self.max_rate) / 2)
+                state.concurrency = max(1, state.concurrency // 2)
+                with self.__lock:
+                    self.throttled += 1
+            elif status is not None:
+                w = self.latency_weight
+                state.latency = latency if state.latency is None else (1 - w) * state.latency + w * latency
+                if state.latency > self.target_latency:
+                    if not state.rate:
+                        state.rate = self.max_rate
+                    state.rate = max(self.min_rate, state.rate * self.slowdown_factor)
+                else:
+                    if state.rate:
+                        state.rate = min(self.max_rate, state.rate + self.rate_step)
+                    state.concurrency = min(self.max_concurrency, state.concurrency + 1)
+            state.condition.notify_all()
+
+    def info(self):
+        return self.scheduler_info_class(self.requests, self.wait_time, self.max_wait, self.throttled)
+
+    def limits(self):
+        """
+            Returns {host: (rate, concurrency)}
+        """
+        with self.__lock:
+            states = dict(self.__hosts)
+        return {host: (state.rate, state.concurrency) for host, state in states.items()}
+
+
+host_scheduler = HostScheduler()
+
+
+class CircuitBreaker:
+    """
+        Per host circuit breaker. After 'threshold' failures in a row the host is 'open' -
+        allow(host) returns False during 'reset_timeout' seconds, so requests to a dead host fail immediately.
+        After that one trial request is allowed (half-open), its success closes the circuit,
+        its failure opens it again. If the trial is not recorded during 'reset_timeout' (it was interrupted)
+        then next trial is allowed.
+
+        Common usages
+            breaker = CircuitBreaker(threshold=3, reset_timeout=60)
+            if breaker.allow('blog.lan'):
+                ... request ...
+                breaker.record('blog.lan', is_failed)
+    """
+
+    threshold = 3
+
+    reset_timeout = 60.0
+
+    def __init__(self, threshold=None, reset_timeout=None) -> None:
+        if threshold is not None:
+            self.threshold = int(threshold)
+        if reset_timeout is not None:
+            self.reset_timeout = reset_timeout
+        self.__lock = threading.Lock()
+        # host -> [failures in a row, time when it was opened or None, time when trial request was sent or None]
+        self.__hosts = {}
+        super().__init__()
+
+    def allow(self, host):
+        with self.__lock:
+            state = self.__hosts.get(host)
+            if state is None or state[1] is None:
+                return True
+            now = monotonic()
+            if now - state[1] < self.reset_timeout or state[2] is not None and now - state[2] < self.reset_timeout:
+                return False
+            state[2] = now
+            return True
+
+    def record(self, host, is_failed):
+        with self.__lock:
+            state = self.__hosts.setdefault(host, [0, None, None])
+            if not is_failed:
+                state[:] = [0, None, None]
+                return
+            state[0] += 1
+            if state[0] >= self.threshold:
+                state[1], state[2] = (monotonic(), None)
+
+    def failures(self, host):
+        with self.__lock:
+            state = self.__hosts.get(host)
+            return state[0] if state else 0
+
+    def clear(self):
+        with self.__lock:
+            self.__hosts.clear()
+
+
+if __name__ == '__main__':
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    test = HostScheduler(rate=10, concurrency=2)
+
+    def request(i):
+        test.acquire('blog.lan')
+        sleep(0.01)
+        test.release('blog.lan', 0.01, 429 if i == 5 else 200, {'Retry-After': '1'})
+
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(request, range(20)))
+    print(test.info(), test.limits())
+
+    # Result should be like
+    # SchedulerInfo(requests=20, wait_time=..., max_wait=1..., throttled=1) {'blog.lan': (..., ...)}
@@ -0,0 +1,221 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: lib
+# File: similarity.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+"""
+    Similarity matrix of texts (TF-IDF weighted n-grams + cosine) and optimal assignment
+    of rows to columns over this matrix (Hungarian algorithm over independent blocks of similar pairs)
+"""
+import math
+from collections import Counter, defaultdict
+
+
+class NgramVectorizer:
+    """
+        Converts texts into sparse vectors (dict {ngram: weight}) normalized to unit length.
+        Weight is tf * idf, where idf is computed over all texts passed into fit_transform(...).
+        N-grams that occur in more than max_df part of texts are ignored - they do not help
+        to distinguish texts, but make computation of similarity slower.
+
+        analyzer
+            'word' - n-grams of words
+            'char' - n-grams of characters
+    """
+
+    analyzer = 'word'
+
+    ngram_size = 2
+
+    max_df = 0.5
+
+    def __init__(self, analyzer=None, ngram_size=None, max_df=None) -> None:
+        if analyzer is not None:
+            self.analyzer = analyzer
+        if ngram_size is not None:
+            self.ngram_size = int(ngram_size)
+        if max_df is not None:
+            self.max_df = max_df
+        if self.analyzer not in ('word', 'char'):
+            raise ValueError('analyzer is {} but must be either "word" or "char"'.format(self.analyzer))
+        super().__init__()
+
+    def ngrams(self, text):
+        size = self.ngram_size
+        if self.analyzer == 'word':
+            items = str(text).split()
+            join = ' '.join
+        else:
+            items = ' '.join(str(text).split())
+            join = ''.join
+        if len(items) <= size:
+            return Counter([join(items)]) if items else Counter()
+        return Counter(join(items[i:i + size]) for i in range(len(items) - size + 1))
+
+    def fit_transform(self, texts):
+        counts = [self.ngrams(text) for text in texts]
+        df = Counter()
+        for cnt in counts:
+            df.update(cnt.keys())
+
+        ntexts = len(counts)
+        max_df = self.max_df * ntexts if ntexts > 1 else ntexts
+        idf = {ngram: math.log((1 + ntexts) / (1 + n)) + 1 for ngram, n in df.items() if n <= max_df}
+
+        vectors = []
+        for cnt in counts:
+            vec = {ngram: tf * idf[ngram] for ngram, tf in cnt.items() if ngram in idf}
+            norm = math.sqrt(sum(w * w for w in vec.values()))
+            vectors.append({ngram: w / norm for ngram, w in vec.items()} if norm else {})
+        return vectors
+
+
+def similarity_pairs(rows, cols, min_similarity=0.0, candidates=None):
+    """
+        Cosine similarity of vectors from rows to vectors from cols (vectors are unit length) in sparse
+        form: {(row, col): similarity} only for pairs with similarity greater than min_similarity.
+        Columns are indexed by n-gram (inverted index), so for each row only n-grams which it has are visited.
+        If candidates (list of col indexes for each row) is passed then only these pairs are computed.
+    """
+    pairs = {}
+    if candidates is not None:
+        for i, js in enumerate(candidates):
+            vec = rows[i]
+            for j in js:
+                col = cols[j]
+                u, v = (vec, col) if len(vec) <= len(col) else (col, vec)
+                sim = sum(w * v.get(ngram, 0.0) for ngram, w in u.items())
+                if sim > min_similarity:
+                    pairs[i, j] = sim
+        return pairs
+
+    postings = defaultdict(list)
+    for j, vec in enumerate(cols):
+        for ngram, w in vec.items():
+            postings[ngram].append((j, w))
+
+    for i, vec in enumerate(rows):
+        row = defaultdict(float)
+        for ngram, w in vec.items():
+            for j, cw in postings.get(ngram, ()):
+                row[j] += w * cw
+        pairs.update(((i, j), sim) for j, sim in row.items() if sim > min_similarity)
+    return pairs
+
+
+def connected_blocks(pairs):
+    """
+        Splits bipartite graph of (row, col) pairs into connected blocks.
+        Returns list of (rows, cols), both are sorted lists of indexes.
+    """
+    parent = {}
+
+    def find(node):
+        root = node
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = (root, parent[node])
+        return root
+
+    for i, j in pairs:
+        a, b = (find((0, i)), find((1, j)))
+        if a != b:
+            parent[a] = b
+
+    blocks = defaultdict(lambda: ([], []))
+    for node in parent:
+        blocks[find(node)][node[0]].append(node[1])
+    return sorted((sorted(rows), sorted(cols)) for rows, cols in blocks.values())
+
+
+def linear_sum_assignment(cost):
+    """
+        Hungarian algorithm (shortest augmenting path, O(n^2 * m)) for rectangular cost matrix [n][m].
+        It returns list of (row, col) pairs with minimal total cost, each row and each col are used at most once.
+        If n > m then matrix is transposed internally, so min(n, m) pairs are returned always.
+    """
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    if not n or not m:
+        return []
+    if n > m:
+        return sorted((r, c) for c, r in linear_sum_assignment([list(col) for col in zip(*cost)]))
+
+    inf = float('inf')
+    # potentials u (rows), v (cols), p[j] - row assigned to col j, 1-based with fictive row/col 0
+    u, v, p, way = ([0.0] * (n + 1), [0.0] * (m + 1), [0] * (m + 1), [0] * (m + 1))
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = (p[j0], inf, 0)
+            cost_i0 = cost[i0 - 1]
+            ui0 = u[i0]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = cost_i0[j - 1] - ui0 - v[j]
+                    if cur < minv[j]:
+                        minv[j], way[j] = (cur, j0)
+                    if minv[j] < delta:
+                        delta, j1 = (minv[j], j)
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while True:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+            if not j0:
+                break
+
+    return sorted((p[j] - 1, j - 1) for j in range(1, m + 1) if p[j])
+
+
+def assign(rows_texts, cols_texts, min_similarity=0.0, vectorizer=None, candidates=None):
+    """
+        Finds one-to-one assignment of rows_texts to cols_texts with maximal total similarity
+        of pairs which similarity is greater than min_similarity (other pairs are never assigned).
+        It returns list of (row_index, col_index, similarity).
+
+        Only similar pairs are kept (sparse), they fall apart into independent connected blocks
+        and the Hungarian algorithm is run for each block separately, so cost depends on sizes of blocks
+        and not on len(rows_texts) * len(cols_texts). candidates (list of col indexes for each row,
+        for example from MinHashLSH) limits pairs that are considered at all.
+    """
+    vectorizer = vectorizer or NgramVectorizer()
+    vectors = vectorizer.fit_transform([*rows_texts, *cols_texts])
+    nrows = len(rows_texts)
+    pairs = similarity_pairs(vectors[:nrows], vectors[nrows:], min_similarity, candidates)
+
+    result = []
+    for rows, cols in connected_blocks(pairs):
+        cost = [[-pairs.get((i, j), 0.0) for j in cols] for i in rows]
+        for r, c in linear_sum_assignment(cost):
+            sim = pairs.get((rows[r], cols[c]))
+            if sim is not None:
+                result.append((rows[r], cols[c], sim))
+    return sorted(result)
+
+
+if __name__ == '__main__':
+
+    posts = ['the quick brown fox jumps over the lazy dog',
+             'openssl config files and certificates of the site']
+    files = ['OpenSSL config files and certificates of site',
+             'the quick brown fox jumped over the lazy dog',
+             'something completely different']
+    print(assign(posts, files))
+    # Result should be like
+    # [(0, 1, 0.6...), (1, 0, 0.5...)]
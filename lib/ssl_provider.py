@@ -5,11 +5,22 @@
 # Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
 # Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
 
-from urllib.request import urlopen, Request
-from urllib.parse import urlparse
-from http.client import HTTPResponse
-from urllib.error import URLError
+from urllib.request import urlopen, Request, getproxies, proxy_bypass
+from urllib.parse import urlparse, urljoin
+from http.client import HTTPResponse, HTTPConnection, HTTPSConnection, RemoteDisconnected
+from urllib.error import URLError, HTTPError
+from collections import defaultdict, namedtuple
+from time import monotonic, sleep
+import io
+import json
+import os
+import random
+import socket
 import ssl
+import sys
+import tempfile
+import threading
+import zlib
 
 # By default it is suitable for client to server connection
 # where /home/ox23/openssl-ca/blog-ca/blog.crt is certificate of requested URL (site)
@@ -19,35 +30,532 @@ import ssl
 # ssl_context.verify_mode = ssl.CERT_NONE
 
 
+class SSLContextRegistry:
+    """
+        SSL contexts per host. Host that has trusted (self-signed) certificate gets its own context
+        (default context + this certificate), other hosts use the default context.
+        Contexts are never changed after they were returned, so they can be used from threads and asyncio
+        (via executors) at same time. Probes of same host are serialized by per host lock.
+
+        If 'trust_store' (JSON file {"host:port": PEM}) is set then trusted certificates are kept there,
+        thus next runs do not make probe connection for getting of server certificate.
+
+        Common usages
+            registry = SSLContextRegistry('trusted_certs.json')
+            registry.get(('blog.lan', 443)) - context for the host (default one if host has no trusted certificate)
+            registry.trust(('blog.lan', 443)) - gets server certificate and returns new context that trusts it
+            registry.load_verify_locations('/home/ox23/openssl-ca/blog-ca/blog.crt') - CA for all contexts
+            registry.reset() - forgets all trusted certificates and CA files (trust store file stays untouched)
+    """
+
+    def __init__(self, trust_store=None) -> None:
+        self.__lock = threading.Lock()
+        self.__host_locks = defaultdict(threading.Lock)
+        self.__trust_store = None
+        self.reset()
+        self.trust_store = trust_store
+        super().__init__()
+
+    @staticmethod
+    def _key(addr):
+        host, port = addr
+        return '{}:{}'.format(host, port)
+
+    def _new_context(self, cadata=None):
+        context = ssl.create_default_context()
+        for cafile in self.__cafiles:
+            context.load_verify_locations(cafile=cafile)
+        if cadata:
+            context.load_verify_locations(cadata=cadata)
+        return context
+
+    @property
+    def trust_store(self):
+        return self.__trust_store
+
+    @trust_store.setter
+    def trust_store(self, value):
+        """
+            Certificates from the file are trusted in addition to already trusted ones
+        """
+        self.__trust_store = value
+        if not value or not os.path.exists(value):
+            return
+        with open(value, mode='r', encoding='utf8') as fd:
+            certs = json.load(fd)
+        with self.__lock:
+            for key, pem in certs.items():
+                self.__certs.setdefault(key, pem)
+
+    def _save(self):
+        if not self.__trust_store:
+            return
+        with self.__lock:
+            certs = dict(self.__certs)
+        directory = os.path.dirname(os.path.abspath(self.__trust_store))
+        fd, tmp_file = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, mode='w', encoding='utf8') as tmp:
+            json.dump(certs, tmp, indent=4)
+        os.replace(tmp_file, self.__trust_store)
+
+    def get(self, addr=None):
+        if addr is None:
+            return self.__default
+        key = self._key(addr)
+        with self.__lock:
+            context = self.__contexts.get(key)
+            if context is None and key in self.__certs:
+                # certificate is from trust store, context is created on first use
+                context = self.__contexts[key] = self._new_context(self.__certs[key])
+            return context or self.__default
+
+    def trust(self, addr, failed_context=None):
+        """
+            Makes the probe connection and trusts certificate of the server.
+            If failed_context is passed and the host has another context already
+            (other thread has trusted it while this one was failing) then it is returned without probe.
+        """
+        key = self._key(addr)
+        with self.__lock:
+            host_lock = self.__host_locks[key]
+        with host_lock:
+            current = self.get(addr)
+            if failed_context is not None and current is not failed_context:
+                return current
+
+            # get_server_certificate(...) does not verify the certificate, so no context is needed
+            pem = ssl.get_server_certificate(addr)
+            context = self._new_context(pem)
+            with self.__lock:
+                self.__certs[key], self.__contexts[key] = (pem, context)
+        self._save()
+        return context
+
+    def load_verify_locations(self, cafile):
+        with self.__lock:
+            self.__cafiles.append(cafile)
+            self.__default.load_verify_locations(cafile=cafile)
+            for context in self.__contexts.values():
+                context.load_verify_locations(cafile=cafile)
+        return self.__default
+
+    def ca_certs(self, binary_form=False):
+        return self.__default.get_ca_certs(binary_form)
+
+    def reset(self):
+        with self.__lock:
+            self.__cafiles, self.__certs, self.__contexts = ([], {}, {})
+            self.__default = ssl.create_default_context()
+        return self.__default
+
+
+context_registry = SSLContextRegistry()
+
+
 def context_reset():
-    get_context.context = ssl.create_default_context()
-    return get_context.context
+    return context_registry.reset()
 
 
-def get_context(addr=None, *, cafile=None):
+def get_context(addr=None, *, cafile=None, failed_context=None):
     """
         Common usages
-        get_context((ip_or_host, port)) - will get a server certificate and add it to the current context CA
-        get_context.reset() - will reset the current context to the default state
-        get_context() - It just returns a current context
+        get_context((ip_or_host, port)) - will get a server certificate and return context that trusts it
+        get_context.reset() - will reset all contexts to the default state
+        get_context(cafile='/path/to/ca.crt') - adds CA to all contexts
+        get_context() - It just returns a default context
+        Contexts are kept per host in 'context_registry' (see SSLContextRegistry).
     """
-    context = get_context.context
     if cafile:
-        context.load_verify_locations(cafile=cafile)
+        return context_registry.load_verify_locations(cafile)
     elif addr:
-        chn, vm = (context.check_hostname, context.verify_mode)
+        return context_registry.trust(addr, failed_context)
+    return context_registry.get()
+
+
+get_context.reset = context_reset
+get_context.ca_certs = lambda binary_form=False: context_registry.ca_certs(binary_form)
+
+
+def _cut_timeout(timeout, deadline):
+    """
+        Returns timeout (sec) that is cut by the rest of time till deadline (monotonic() time),
+        it raises TimeoutError if deadline has passed
+    """
+    if deadline is None:
+        return timeout
+    rest = deadline - monotonic()
+    if rest <= 0:
+        raise TimeoutError('Deadline of the request has expired.')
+    return rest if timeout is None else min(timeout, rest)
+
+
+class PooledHTTPResponse(HTTPResponse):
+    """
+        It returns the connection into the pool when body was read completely (or response was closed).
+        If response was closed before end of body then connection is closed too - it can't be reused.
+
+        If 'deadline' (monotonic() time) is set then timeout of each read is 'read_timeout' cut by the rest
+        of time till deadline, so reading of the body does not last longer than the deadline.
+    """
+
+    _pool_release = None
+
+    _pool_sock = None
+
+    read_timeout = None
+
+    deadline = None
+
+    def _cut_read_timeout(self):
+        if self.deadline is not None and self.fp is not None and self._pool_sock is not None:
+            self._pool_sock.settimeout(_cut_timeout(self.read_timeout, self.deadline))
+
+    def read(self, amt=None):
+        self._cut_read_timeout()
+        return super().read(amt)
+
+    def read1(self, n=-1):
+        self._cut_read_timeout()
+        return super().read1(n)
+
+    def readinto(self, b):
+        self._cut_read_timeout()
+        return super().readinto(b)
+
+    def readline(self, limit=-1):
+        self._cut_read_timeout()
+        return super().readline(limit)
+
+    def _release(self, reusable):
+        release, self._pool_release = (self._pool_release, None)
+        if release is not None:
+            release(reusable)
+
+    def _close_conn(self):
+        super()._close_conn()
+        self._release(not self.will_close)
+
+    def close(self):
+        # body is not read completely - rest of it is still in socket
+        is_unread = self.fp is not None and (self.chunked or bool(self.length))
+        if is_unread:
+            self._release(False)
         try:
-            context.check_hostname, context.verify_mode = (False, ssl.CERT_NONE)
-            context.load_verify_locations(cadata=ssl.get_server_certificate(addr))
+            super().close()
         finally:
-            context.check_hostname, context.verify_mode = (chn, vm)
+            self._release(not self.will_close)
 
-    return context
 
+_DEFAULT_TIMEOUT = object()
+"""
+    Marker of timeout that is not passed, socket.getdefaulttimeout() is used then
+"""
 
-get_context.context = ssl.create_default_context()
-get_context.reset = context_reset
-get_context.ca_certs = lambda binary_form=False: get_context.context.get_ca_certs(binary_form)
+
+class ConnectionPool:
+    """
+        Keeps persistent (keep-alive) connections per (scheme, host, port, ssl context),
+        thus a lot of requests to same host do not pay TCP and TLS handshakes on each request.
+
+        maxsize - maximum of idle connections that are kept per host
+        idle_timeout - idle connection older than this (sec) is closed instead of reusing
+
+        urlopen(url, context=None, timeout=None, read_timeout=None, deadline=None) is a replacement
+        of urllib.request.urlopen for http(s) urls, 'timeout' is used for connecting and 'read_timeout'
+        (if it is passed) for response, 'deadline' (monotonic() time) cuts read timeouts of the response
+        and of its body (see PooledHTTPResponse),
+        it follows redirects and raises HTTPError for not 2xx statuses same as urllib does.
+        Other schemes and urls that have to go through a proxy (urllib.request.getproxies(), that is
+        http_proxy, https_proxy and no_proxy environment variables) are passed into urllib.request.urlopen.
+
+        Common usages
+            pool = ConnectionPool(maxsize=4, idle_timeout=30)
+            resp = pool.urlopen(Request('https://blog.lan/', method='HEAD'), context=get_context())
+            resp.close() - or read it to the end, after that the connection can be reused
+            pool.close() - closes all idle connections
+    """
+
+    maxsize = 4
+
+    idle_timeout = 30.0
+
+    max_redirections = 10
+
+    user_agent = 'Python-urllib/%d.%d' % sys.version_info[:2]
+
+    response_class = PooledHTTPResponse
+
+    def __init__(self, maxsize=None, idle_timeout=None) -> None:
+        if maxsize is not None:
+            self.maxsize = int(maxsize)
+        if idle_timeout is not None:
+            self.idle_timeout = idle_timeout
+        # key -> list of (connection, time when it became idle)
+        self.__idle = defaultdict(list)
+        self.__lock = threading.Lock()
+        super().__init__()
+
+    @staticmethod
+    def _key(purl, context):
+        port = purl.port or (443 if purl.scheme == 'https' else 80)
+        return purl.scheme, purl.hostname, port, id(context) if purl.scheme == 'https' else None
+
+    def _new_connection(self, key, context, timeout):
+        scheme, host, port, _ = key
+        kwargs = {} if timeout is _DEFAULT_TIMEOUT else {'timeout': timeout}
+        if scheme == 'https':
+            conn = HTTPSConnection(host, port, context=context, **kwargs)
+        else:
+            conn = HTTPConnection(host, port, **kwargs)
+        conn.response_class = self.response_class
+        return conn
+
+    def _acquire(self, key, context, timeout):
+        """
+            Returns 2-tuple (connection, is_reused)
+        """
+        now = monotonic()
+        with self.__lock:
+            idle = self.__idle[key]
+            while idle:
+                conn, since = idle.pop()
+                if now - since <= self.idle_timeout:
+                    conn.timeout = socket.getdefaulttimeout() if timeout is _DEFAULT_TIMEOUT else timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(conn.timeout)
+                    return conn, True
+                conn.close()
+        return self._new_connection(key, context, timeout), False
+
+    def _release(self, key, conn, reusable):
+        if not reusable or conn.sock is None:
+            conn.close()
+            return
+        with self.__lock:
+            idle = self.__idle[key]
+            if len(idle) < self.maxsize:
+                idle.append((conn, monotonic()))
+                return
+        conn.close()
+
+    def close(self):
+        with self.__lock:
+            idle, self.__idle = (self.__idle, defaultdict(list))
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+    def _request(self, req, context, timeout, read_timeout=None, deadline=None):
+        purl = urlparse(req.full_url)
+        key = self._key(purl, context)
+        headers = {name.title(): val for name, val in req.header_items()}
+        headers.setdefault('User-Agent', self.user_agent)
+
+        conn, is_reused = self._acquire(key, context, timeout)
+        while True:
+            try:
+                conn.request(req.get_method(), req.selector, body=req.data, headers=headers)
+                if (read_timeout is not None or deadline is not None) and conn.sock is not None:
+                    # connection is established, timeout = connect timeout was used for it
+                    conn.sock.settimeout(_cut_timeout(read_timeout, deadline))
+                resp = conn.getresponse()
+            except (RemoteDisconnected, ConnectionResetError, BrokenPipeError) as err:
+                conn.close()
+                if is_reused:
+                    # server has closed the idle keep-alive connection, new one will be tried
+                    conn, is_reused = (self._new_connection(key, context, timeout), False)
+                    continue
+                raise URLError(err)
+            except OSError as err:
+                conn.close()
+                raise URLError(err)
+            break
+
+        resp._pool_release = lambda reusable: self._release(key, conn, reusable)
+        resp._pool_sock, resp.read_timeout, resp.deadline = (conn.sock, read_timeout, deadline)
+        resp.url = req.full_url
+        if resp.length == 0:
+            # nothing to read (HEAD, 204, 304 ...), connection can be reused right now
+            resp._close_conn()
+        return resp
+
+    def _redirect_request(self, req, resp):
+        """
+            It returns new Request for redirection or None, same rules as urllib.request.HTTPRedirectHandler has
+        """
+        location = resp.headers.get('location') or resp.headers.get('uri')
+        method = req.get_method()
+        if not location or resp.status not in (301, 302, 303, 307, 308):
+            return None
+        if not (resp.status in (307, 308) and method in ('GET', 'HEAD')
+                or resp.status in (301, 302, 303) and method in ('GET', 'HEAD', 'POST')):
+            return None
+
+        new_url = urljoin(req.full_url, location)
+        if urlparse(new_url).scheme not in ('http', 'https', 'ftp', ''):
+            return None
+        headers = {key: val for key, val in req.headers.items() if key.lower() not in ('content-length', 'content-type')}
+        return Request(new_url, headers=headers, origin_req_host=req.origin_req_host, unverifiable=True,
+                       method='HEAD' if method == 'HEAD' else 'GET')
+
+    @staticmethod
+    def _is_proxied(purl):
+        """
+            True if url has to be requested through a proxy, which the pool does not support
+        """
+        proxies = getproxies()
+        return purl.scheme in proxies and not proxy_bypass(purl.hostname or '')
+
+    @staticmethod
+    def _urllib_open(req, context, timeout, read_timeout=None):
+        # urllib has a single timeout for connecting and reading
+        if read_timeout is not None:
+            timeout = read_timeout
+        kwargs = {} if timeout is _DEFAULT_TIMEOUT else {'timeout': timeout}
+        try:
+            return urlopen(req, context=context, **kwargs)
+        except URLError:
+            raise
+        except OSError as err:
+            # urllib wraps errors of sending of request only, reading of response (timeout ...) raises them as is
+            raise URLError(err)
+
+    def urlopen(self, url, context=None, timeout=_DEFAULT_TIMEOUT, read_timeout=None, deadline=None):
+        req = url if isinstance(url, Request) else Request(url)
+        visited = set()
+        while True:
+            purl = urlparse(req.full_url)
+            if purl.scheme not in ('http', 'https') or self._is_proxied(purl):
+                # urllib follows further redirections itself
+                return self._urllib_open(req, context, timeout, read_timeout)
+
+            resp = self._request(req, context, timeout, read_timeout, deadline)
+            if 200 <= resp.status < 300:
+                return resp
+
+            # error and redirection bodies are small, reading releases the connection
+            body = resp.read()
+            resp.close()
+            new_req = self._redirect_request(req, resp)
+            if new_req is None:
+                raise HTTPError(req.full_url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+
+            visited.add(req.full_url)
+            if new_req.full_url in visited or len(visited) > self.max_redirections:
+                raise HTTPError(req.full_url, resp.status, 'The HTTP server returned a redirect error that would '
+                                'lead to an infinite loop.', resp.headers, io.BytesIO(body))
+            req = new_req
+
+
+connection_pool = ConnectionPool()
+
+
+class TransferStatistics:
+    """
+        Counts bytes of compressed responses
+            wire_bytes - as they were received
+            decoded_bytes - after decompression
+    """
+
+    transfer_info_class = namedtuple('TransferInfo', ['responses', 'wire_bytes', 'decoded_bytes'])
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.responses = self.wire_bytes = self.decoded_bytes = 0
+        super().__init__()
+
+    def add(self, wire_bytes=0, decoded_bytes=0, responses=0):
+        with self.__lock:
+            self.responses += responses
+            self.wire_bytes += wire_bytes
+            self.decoded_bytes += decoded_bytes
+
+    def info(self):
+        return self.transfer_info_class(self.responses, self.wire_bytes, self.decoded_bytes)
+
+    def clear(self):
+        with self.__lock:
+            self.responses = self.wire_bytes = self.decoded_bytes = 0
+
+
+transfer_statistics = TransferStatistics()
+
+
+class DecodedResponse(io.BufferedIOBase):
+    """
+        Wrapper of response with 'Content-Encoding: gzip' or 'deflate'. Body is decompressed
+        by chunks while it is read, so it can be passed into lxml parser without buffering of whole body.
+        Other attributes (status, reason, headers ...) are taken from the response,
+        headers stay as they were received (Content-Encoding, Content-Length of compressed body).
+    """
+
+    encodings = ('gzip', 'x-gzip', 'deflate')
+
+    chunk_size = 16 * 1024
+
+    def __init__(self, response, encoding, statistics=None) -> None:
+        super().__init__()
+        self.response = response
+        self.statistics = transfer_statistics if statistics is None else statistics
+        self.__is_deflate = encoding == 'deflate'
+        self.__decompressor = zlib.decompressobj(zlib.MAX_WBITS if self.__is_deflate else 16 + zlib.MAX_WBITS)
+        self.__is_started = False
+        self.__buffer = b''
+        self.__eof = False
+        self.statistics.add(responses=1)
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def readable(self):
+        return True
+
+    def _decompress(self, data):
+        try:
+            return self.__decompressor.decompress(data)
+        except zlib.error:
+            if not self.__is_deflate or self.__is_started:
+                raise
+            # some servers send raw deflate stream without zlib header
+            self.__decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self.__decompressor.decompress(data)
+        finally:
+            self.__is_started = True
+
+    def _fill(self):
+        data = self.response.read(self.chunk_size)
+        if data:
+            decoded = self._decompress(data)
+        else:
+            decoded, self.__eof = (self.__decompressor.flush(), True)
+        self.__buffer += decoded
+        self.statistics.add(len(data), len(decoded))
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while not self.__eof:
+                self._fill()
+            data, self.__buffer = (self.__buffer, b'')
+            return data
+
+        while not self.__buffer and not self.__eof and size:
+            self._fill()
+        data, self.__buffer = (self.__buffer[:size], self.__buffer[size:])
+        return data
+
+    def read1(self, size=-1):
+        return self.read(size)
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        try:
+            self.response.close()
+        finally:
+            super().close()
 
 
 class GetResponse:
@@ -77,13 +585,59 @@ class GetResponse:
         If GetResponse(url, False) it will raise exception if certificate self-signed,
         have no trusted cert in system or context does not configured properly
 
+        Requests use keep-alive connections from 'connection_pool' (module's connection_pool by default).
+        If it is None then each request will be made by urllib.request.urlopen (new connection each time).
+
+        If 'http_cache' is HttpCache (lib/http_cache.py) then GET requests are conditional
+        (If-None-Match / If-Modified-Since) and 304 Not Modified is served from the cache.
+
+        GET requests are sent with 'Accept-Encoding: accept_encoding' (if request has no own one),
+        compressed body is decoded while it is read (see DecodedResponse), the cache keeps it compressed.
+
+        Each request waits for a slot of its host in 'scheduler' (HostScheduler, lib/scheduler.py),
+        the slot is released when response headers are received. None (default) - requests are not limited,
+        site_text_compare.py sets the shared host_scheduler.
+
+        Timeouts (sec): 'connect_timeout' - for connecting, 'read_timeout' - for each read of the response
+        (urllib.request.urlopen, when connection_pool is None, uses read_timeout for both).
+        If GetResponse(url, timeout=T) then T is used for both. 'deadline' - total time for the url
+        including retries and reading of the body, timeouts of each attempt and each read of the body
+        (with connection_pool) are cut by the rest of it.
+        Transient errors (timeouts, connection errors, 'retry_statuses') of 'retry_methods' are retried
+        up to 'retries' times with jittered exponential backoff - random delay in [0, backoff_base * 2 ** attempt].
     """
     _url = ''
     _allow_self_signed_cert = False
+    _timeout = None
+
+    connection_pool = connection_pool
 
-    def __init__(self, url, allow_self_signed_cert=True) -> None:
+    http_cache = None
+
+    scheduler = None
+
+    accept_encoding = 'gzip, deflate'
+
+    connect_timeout = 10.0
+
+    read_timeout = 30.0
+
+    deadline = 120.0
+
+    retries = 2
+
+    retry_methods = ('GET', 'HEAD')
+
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    backoff_base = 0.5
+
+    backoff_max = 10.0
+
+    def __init__(self, url, allow_self_signed_cert=True, timeout=None) -> None:
         self._url = url
         self._allow_self_signed_cert = bool(allow_self_signed_cert)
+        self._timeout = timeout
 
     @staticmethod
     def _get_ssl_addr(url):
@@ -101,7 +655,7 @@ class GetResponse:
                 return None
         return o.hostname, port
 
-    def _self_signed_fallback(self, err, ssl_addr):
+    def _self_signed_fallback(self, err, ssl_addr, failed_context=None):
         if not self._allow_self_signed_cert:
             raise err
 
@@ -109,30 +663,157 @@ class GetResponse:
         if isinstance(err, URLError):
             reason = err.reason
         if isinstance(reason, ssl.SSLCertVerificationError) and reason.errno == 1 \
-                and reason.verify_code == 18 and reason.verify_message == 'self signed certificate':
-            print('Certificate is self-signed: so used as one time CA.')
+                and reason.verify_code == 18 \
+                and reason.verify_message in ('self signed certificate', 'self-signed certificate'):
+            context = get_context(ssl_addr, failed_context=failed_context)
         else:
             raise err
 
-        return get_context(ssl_addr)
+        if context_registry.trust_store:
+            print('Certificate is self-signed: so it is trusted and saved into {}.'.format(
+                context_registry.trust_store
+            ))
+        else:
+            print('Certificate is self-signed: so used as one time CA.')
+        return context
+
+    def _get_opener(self):
+        opener = urlopen if self.connection_pool is None else self.connection_pool.urlopen
+        if self.scheduler is None:
+            return opener
 
-    def _get_response(self, url):
-        context = get_context()
+        def scheduled_opener(url, **kwargs):
+            host = urlparse(url.full_url if isinstance(url, Request) else url).netloc
+            if not host:
+                # file:// ... etc.
+                return opener(url, **kwargs)
 
+            self.scheduler.acquire(host)
+            start, status, headers = (monotonic(), None, None)
+            try:
+                response = opener(url, **kwargs)
+                status, headers = (getattr(response, 'status', None), getattr(response, 'headers', None))
+                return response
+            except HTTPError as err:
+                status, headers = (err.code, err.headers)
+                raise
+            finally:
+                self.scheduler.release(host, monotonic() - start, status, headers)
+
+        return scheduled_opener
+
+    def _get_timeouts(self, deadline):
+        connect_timeout, read_timeout = (self.connect_timeout, self.read_timeout)
+        if self._timeout is not None:
+            connect_timeout = read_timeout = self._timeout
+        if deadline is not None:
+            rest = max(deadline - monotonic(), 0.001)
+            connect_timeout = rest if connect_timeout is None else min(connect_timeout, rest)
+            read_timeout = rest if read_timeout is None else min(read_timeout, rest)
+        return connect_timeout, read_timeout
+
+    def _is_transient(self, err):
+        if isinstance(err, HTTPError):
+            return err.code in self.retry_statuses
+        reason = err.reason if isinstance(err, URLError) else err
+        if isinstance(reason, (ssl.SSLError, socket.gaierror)):
+            # certificate and DNS errors will be same on next attempt
+            return False
+        return isinstance(reason, (TimeoutError, socket.timeout, ConnectionError))
+
+    def _open(self, url):
+        method = url.get_method() if isinstance(url, Request) else 'GET'
+        retries = self.retries if method in self.retry_methods else 0
+        deadline = monotonic() + self.deadline if self.deadline else None
+        attempt = 0
+        while True:
+            try:
+                return self._open_once(url, *self._get_timeouts(deadline), deadline=deadline)
+            except (URLError, OSError) as err:
+                if not isinstance(err, URLError):
+                    # plain urllib (connection_pool is None) raises errors of reading of response as is
+                    err = URLError(err)
+                if attempt >= retries or not self._is_transient(err):
+                    raise err
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if deadline is not None and monotonic() + delay >= deadline:
+                    raise err
+                if isinstance(err, HTTPError):
+                    err.close()
+            sleep(delay)
+            attempt += 1
+
+    def _open_once(self, url, connect_timeout=None, read_timeout=None, deadline=None):
         ssl_addr = self._get_ssl_addr(url)
-        if ssl_addr is None:
-            # does not look like SSL connection
-            context = None
+        # None if it does not look like SSL connection
+        context = None if ssl_addr is None else context_registry.get(ssl_addr)
 
+        kwargs = {'context': context}
+        if self.connection_pool is None:
+            if read_timeout is not None:
+                kwargs['timeout'] = read_timeout
+        else:
+            if connect_timeout is not None:
+                kwargs['timeout'] = connect_timeout
+            kwargs['read_timeout'] = read_timeout
+            kwargs['deadline'] = deadline
+
+        opener = self._get_opener()
         try:
             # if context exists then test self signed cert
-            response = urlopen(url, context=context)
+            response = opener(url, **kwargs)
         except (URLError, ssl.SSLCertVerificationError) as err:
-            self._self_signed_fallback(err, ssl_addr)
-            response = urlopen(url, context=context)
+            kwargs['context'] = self._self_signed_fallback(err, ssl_addr, context)
+            response = opener(url, **kwargs)
+
+        return response
+
+    @staticmethod
+    def _add_headers(url, headers):
+        """
+            Returns Request with headers which url has not, original Request is not changed
+        """
+        if not isinstance(url, Request):
+            return Request(url, headers=headers)
+
+        req_headers = dict(url.header_items())
+        missing = {name: val for name, val in headers.items() if name.capitalize() not in req_headers}
+        if not missing:
+            return url
+        return Request(url.full_url, data=url.data, headers={**req_headers, **missing},
+                       origin_req_host=url.origin_req_host, unverifiable=url.unverifiable, method=url.get_method())
 
+    @staticmethod
+    def _decode_response(response):
+        headers = getattr(response, 'headers', None)
+        encoding = (headers.get('Content-Encoding') or '').strip().lower() if headers is not None else ''
+        if encoding in DecodedResponse.encodings:
+            return DecodedResponse(response, encoding)
         return response
 
+    def _get_response(self, url):
+        method = url.get_method() if isinstance(url, Request) else 'GET'
+        if method != 'GET':
+            return self._open(url)
+
+        if self.accept_encoding:
+            url = self._add_headers(url, {'Accept-Encoding': self.accept_encoding})
+        if self.http_cache is None:
+            return self._decode_response(self._open(url))
+        return self._decode_response(self._get_cached_response(url))
+
+    def _get_cached_response(self, url):
+        entry = self.http_cache.get(url)
+        try:
+            response = self._open(self.http_cache.conditional_request(url, entry))
+        except HTTPError as err:
+            if err.code != 304 or entry is None:
+                raise
+            err.close()
+            return self.http_cache.response(entry)
+
+        return self.http_cache.store(url, response)
+
     def process(self) -> HTTPResponse:
         return self._get_response(self._url)
 
@@ -0,0 +1,182 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: lib
+# File: urlcanon.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+"""
+    Canonical form of urls and compact sets of urls that are compared by canonical form
+"""
+import hashlib
+import math
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+class UrlCanonicalizer:
+    """
+        Converts url into canonical form, so different urls of same page are equal
+            scheme and host are lower case, default port of scheme and fragment are removed
+            empty path is '/', trailing slash of path is removed (if strip_trailing_slash)
+            query parameters from ignore_params or not from keep_params (if it is not None) are removed
+            parameters with value from default_params are removed ({'page': '1'} - '/?page=1' is '/')
+            the rest parameters are sorted (if sort_query)
+
+        Common usages
+            canonicalizer = UrlCanonicalizer(default_params={'page': '1'})
+            canonicalizer('HTTPS://Blog.lan:443/?page=1#top') - 'https://blog.lan/'
+            canonicalizer.fingerprint(url) - 64-bit integer hash of canonical url
+    """
+
+    default_ports = {'http': 80, 'https': 443}
+
+    strip_trailing_slash = True
+
+    sort_query = True
+
+    keep_params = None
+    """
+        Names of query parameters that are kept, None - all except ignore_params
+    """
+
+    ignore_params = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'gclid', 'fbclid')
+
+    default_params = {}
+
+    def __init__(self, keep_params=None, ignore_params=None, default_params=None, strip_trailing_slash=None,
+                 sort_query=None) -> None:
+        if keep_params is not None:
+            self.keep_params = frozenset(keep_params)
+        if ignore_params is not None:
+            self.ignore_params = ignore_params
+        if default_params is not None:
+            self.default_params = dict(default_params)
+        if strip_trailing_slash is not None:
+            self.strip_trailing_slash = strip_trailing_slash
+        if sort_query is not None:
+            self.sort_query = sort_query
+        super().__init__()
+
+    def _get_netloc(self, parts, scheme):
+        try:
+            host, port = (parts.hostname, parts.port)
+        except ValueError:
+            # port is not a number, netloc is left as is
+            return parts.netloc.lower()
+        if host is None:
+            return parts.netloc.lower()
+
+        userinfo, sep, _ = parts.netloc.rpartition('@')
+        netloc = '{}{}{}'.format(userinfo, sep, '[{}]'.format(host) if ':' in host else host)
+        if port is not None and port != self.default_ports.get(scheme):
+            netloc += ':{}'.format(port)
+        return netloc
+
+    def _get_query(self, query):
+        params = [
+            (name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+            if name not in self.ignore_params and (self.keep_params is None or name in self.keep_params)
+            and self.default_params.get(name) != value
+        ]
+        if self.sort_query:
+            params.sort()
+        return urlencode(params)
+
+    def __call__(self, url):
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        path = parts.path or '/'
+        if self.strip_trailing_slash and len(path) > 1:
+            path = path.rstrip('/') or '/'
+        return urlunsplit((scheme, self._get_netloc(parts, scheme), path, self._get_query(parts.query), ''))
+
+    def fingerprint(self, url):
+        return int.from_bytes(hashlib.blake2b(self(url).encode('utf8'), digest_size=8).digest(), 'big')
+
+
+class BloomFilter:
+    """
+        Set of 64-bit fingerprints with fixed memory (bit array of size that is computed by capacity
+        and error_rate). 'in' can be True for a fingerprint that was not added with probability
+        error_rate (when capacity fingerprints are added), it is never False for added one.
+        Bit positions are h1 + i * h2 where h1 and h2 are halves of the fingerprint.
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.001) -> None:
+        self.capacity = int(capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.__bits = bytearray((self.size + 7) // 8)
+        self.__count = 0
+        super().__init__()
+
+    def _positions(self, fingerprint):
+        h1, h2 = (fingerprint & 0xffffffff, (fingerprint >> 32) | 1)
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, fingerprint):
+        bits = self.__bits
+        is_new = False
+        for pos in self._positions(fingerprint):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                is_new = True
+        self.__count += is_new
+
+    def __contains__(self, fingerprint):
+        bits = self.__bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(fingerprint))
+
+    def __len__(self):
+        """
+            Approximate number of added fingerprints
+        """
+        return self.__count
+
+
+class UrlSet:
+    """
+        Set of urls that are compared by canonical form, only 64-bit fingerprints are kept
+        in 'fingerprints' (set by default or BloomFilter for fixed memory)
+
+        Common usages
+            urls = UrlSet(UrlCanonicalizer(default_params={'page': '1'}))
+            urls.add('https://blog.lan/')
+            'https://blog.lan/?page=1' in urls - True
+    """
+
+    def __init__(self, canonicalizer=None, fingerprints=None) -> None:
+        self.canonicalizer = canonicalizer or UrlCanonicalizer()
+        self.fingerprints = set() if fingerprints is None else fingerprints
+        super().__init__()
+
+    def add(self, url):
+        self.fingerprints.add(self.canonicalizer.fingerprint(url))
+
+    def __contains__(self, url):
+        return self.canonicalizer.fingerprint(url) in self.fingerprints
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+
+if __name__ == '__main__':
+
+    canonicalizer = UrlCanonicalizer(default_params={'page': '1'})
+    for test_url in ('HTTPS://Blog.lan:443/?page=1#top', 'https://blog.lan/entry/9/?text=1&page=2&utm_source=x',
+                     'http://user@[::1]:8080/a//'):
+        print(canonicalizer(test_url))
+    # Result should be
+    # https://blog.lan/
+    # https://blog.lan/entry/9?page=2&text=1
+    # http://user@[::1]:8080/a
+
+    bloom_urls = UrlSet(canonicalizer, BloomFilter(capacity=1000, error_rate=0.01))
+    for i in range(1000):
+        bloom_urls.add('https://blog.lan/?page={}'.format(i))
+    print('https://blog.lan/' in bloom_urls, sum('https://blog.lan/?p={}'.format(i) in bloom_urls
+                                                  for i in range(10000)))
+    # Result should be like
+    # True 100 (about 1% of false positives)
@@ -0,0 +1,62 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: lib
+# File: site_text_benchmark.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+"""
+Benchmark of the comparison pipeline over synthetic blog served by local http.server
+or micro-benchmark of content selectors (--benchmark selectors)
+or of link extraction modes (--benchmark links).
+-h or --help for usage.
+"""
+
+import argparse
+import json
+import sys
+
+from lib.benchmark import ComparePipelineBenchmark, SelectorBenchmark, LinkExtractionBenchmark
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of comparison of site texts to file sources.')
+    parser.add_argument('--benchmark', '-b', choices=['pipeline', 'selectors', 'links'], default='pipeline',
+                        help='what is measured.')
+    parser.add_argument('--pages', type=int, help='number of pages for selectors (2000) or links (200) benchmark.')
+    parser.add_argument('--links', type=int, default=500, help='number of links on a page for links benchmark.')
+    parser.add_argument('--posts', '-p', type=int, default=100, help='number of posts.')
+    parser.add_argument('--size', '-s', type=int, default=1000, help='number of words in each post.')
+    parser.add_argument('--mutation-rate', '-mr', type=float, default=0.01,
+                        help='probability of word replacement in site\'s text.')
+    parser.add_argument('--per-page', '-pp', type=int, default=10, help='number of posts per pager\'s page.')
+    parser.add_argument('--repeat', '-r', type=int, default=1, help='best time of N runs is reported.')
+    parser.add_argument('--seed', type=int, default=0, help='seed of random generator.')
+    parser.add_argument('--option', '-o', action='append', default=[], metavar='NAME=JSON_VALUE',
+                        help='attribute of PostTextsComparer, for example -o jobs=4 -o \'diff_granularity="words"\'.')
+    parser.add_argument('--output', type=str, nargs='?', help='file for JSON result, stdout by default.')
+
+    args = parser.parse_args()
+
+    comparer_options = {}
+    for option in args.option:
+        name, sep, value = option.partition('=')
+        if not sep:
+            raise ValueError('Option should be like NAME=JSON_VALUE.')
+        comparer_options[name.strip()] = json.loads(value)
+
+    if args.benchmark == 'links':
+        bench = LinkExtractionBenchmark(args.pages, args.links, args.repeat, args.seed)
+    elif args.benchmark == 'selectors':
+        bench = SelectorBenchmark(args.pages, args.repeat, args.seed)
+    else:
+        bench = ComparePipelineBenchmark(args.posts, args.size, args.mutation_rate, args.per_page, args.repeat,
+                                         args.seed, comparer_options)
+    result = bench.run(args.output)
+    if not args.output:
+        json.dump(result, sys.stdout, indent=4)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -14,11 +14,16 @@ import argparse
 import os
 from timeit import Timer
 
+from lib.grabber import LinksGrabber
 from lib.html_tools import DiffContent
+from lib.http_cache import HttpCache
+from lib.link_cache import LinkCheckCache
 from lib.post_text_compare import LoggedPostTextsComparer
 from urllib.parse import urlparse
 
 from lib.post_text_link_checker import LoggedPostTextLinkChecker
+from lib.scheduler import host_scheduler
+from lib.ssl_provider import GetResponse, context_registry
 
 
 def main():
@@ -26,14 +31,67 @@ def main():
     parser.add_argument('--url', '-u', type=str, nargs='?',  help='source url.')
     parser.add_argument('--dir', '-d', type=str, nargs='?', help='directory where source html file.')
     parser.add_argument('--relations', '-rel', nargs='?', type=str,
-                        help='resulting file of the comparison.',
+                        help='resulting file of the comparison, *.jsonl - JSON Lines that is written'
+                             ' during the comparison and is continued after interruption.',
                         default='relations.txt'
                         )
     parser.add_argument('--check-links', '-cl', help='check links',
                         choices=[*LoggedPostTextLinkChecker.CHECK_LINK_TYPES]
                         )
+    parser.add_argument('--concurrency', '-cc', type=int, nargs='?', default=1,
+                        help='number of links that are checked at same time.'
+                        )
+    parser.add_argument('--links-cache', '-lc', type=str, nargs='?',
+                        help='file where results of link checking are kept between runs.'
+                        )
+    parser.add_argument('--candidates', '-k', type=int, nargs='?',
+                        help='compare each url only with K most similar files (MinHash/LSH index).'
+                        )
+    parser.add_argument('--cache', '-c', type=str, nargs='?',
+                        help='file where normalized content of source files is cached between runs.'
+                        )
+    parser.add_argument('--cache-size', '-cs', type=int, nargs='?',
+                        help='number of normalized source files that are kept in memory, all by default.'
+                        )
+    parser.add_argument('--granularity', '-g', help='what is compared by diff.',
+                        choices=['chars', *DiffContent.tokenizers]
+                        )
+    parser.add_argument('--match', '-m', help='how urls are matched with files.',
+                        choices=['greedy', 'assignment'], default='greedy'
+                        )
+    parser.add_argument('--jobs', '-j', type=int, nargs='?', default=1,
+                        help='number of processes for comparison.'
+                        )
+    parser.add_argument('--fetch-workers', '-fw', type=int, nargs='?',
+                        help='number of threads that fetch post\'s texts in background.'
+                        )
+    parser.add_argument('--timeout', '-t', type=float, nargs='?',
+                        help='timeout (sec) of each request to the site.'
+                        )
+    parser.add_argument('--http-cache', '-hc', type=str, nargs='?',
+                        help='directory where pages of the site are cached, they are downloaded again'
+                             ' only if they were changed (ETag / Last-Modified).'
+                        )
+    parser.add_argument('--rate', '-r', type=float, nargs='?',
+                        help='requests per second to each host at start, it is adapted by responses.'
+                             ' 0 - unlimited.'
+                        )
+    parser.add_argument('--lookahead', '-la', type=int, nargs='?',
+                        help='number of next pager\'s pages that are requested in background.'
+                        )
+    parser.add_argument('--trust-store', '-ts', type=str, nargs='?',
+                        help='file where accepted self-signed certificates are kept between runs,'
+                             ' they are not saved by default.'
+                        )
 
     args = parser.parse_args()
+    if args.trust_store:
+        context_registry.trust_store = args.trust_store
+    GetResponse.scheduler = host_scheduler
+    if args.rate is not None:
+        host_scheduler.rate = args.rate
+    if args.lookahead is not None:
+        LinksGrabber.lookahead = args.lookahead
 
     if not args.dir and not args.url:
         # returns information from relation file
@@ -41,12 +99,15 @@ def main():
         post_comp = LoggedPostTextsComparer('', '', args.relations if args.relations else None)
         if args.check_links:
             print('Running validation of "{}" links'.format(args.check_links))
-            urls = (rel.url for rel in post_comp.relations if rel.url)
+            urls = (rel.url for rel in post_comp.iter_relations() if rel.url)
             checker = LoggedPostTextLinkChecker.from_urls(urls)
             checker.check_link_type = args.check_links
+            checker.concurrency = args.concurrency or 1
+            if args.links_cache:
+                checker.link_cache = LinkCheckCache(args.links_cache)
             checker.check()
         else:
-            for i, rel in enumerate(post_comp.relations):
+            for i, rel in enumerate(post_comp.iter_relations()):
                 print('{}:'.format(i+1), rel.url, '->', rel.file)
                 indent = default_indent
                 print(indent + 'Ratio:', rel.ratio)
@@ -68,7 +129,21 @@ def main():
     if not url.netloc:
         raise ValueError('Url should be valid url.')
 
-    post_comp = LoggedPostTextsComparer(args.url, args.dir, args.relations if args.relations else None).compare()
+    post_comp = LoggedPostTextsComparer(args.url, args.dir, args.relations if args.relations else None)
+    post_comp.candidates_limit = args.candidates
+    post_comp.file_content_cache_file = args.cache
+    post_comp.file_content_cache_size = args.cache_size
+    post_comp.diff_granularity = args.granularity
+    post_comp.match_mode = args.match
+    post_comp.jobs = args.jobs or 1
+    if args.fetch_workers is not None:
+        post_comp.fetch_workers = args.fetch_workers
+    post_comp.fetch_timeout = args.timeout
+    if args.http_cache:
+        GetResponse.http_cache = HttpCache(args.http_cache)
+    post_comp.compare()
+    if GetResponse.http_cache is not None:
+        print('HTTP cache info:', GetResponse.http_cache.info())
     post_comp.dump_relations()
     print('Details of comparison see in {} or rerun without parameters.'.format(post_comp.relation_file_name))
 
@@ -0,0 +1,12 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: conftest.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import os
+import sys
+
+# modules of the project are imported as lib.xxx (same as scripts in the root do)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,47 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_best_match.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import random
+
+import pytest
+
+from lib.html_tools import DiffContent
+from lib.post_text_compare import BestMatchFinder
+
+
+def mutate(words, rate, rnd):
+    return [rnd.choice(('x', 'y', 'z')) if rnd.random() < rate else w for w in words]
+
+
+@pytest.mark.parametrize('granularity', ['chars', 'words'])
+def test_upper_bounds_are_not_less_than_ratio(granularity):
+    rnd = random.Random(1)
+    for _ in range(20):
+        a = ' '.join(mutate(['w{}'.format(rnd.randrange(50)) for _ in range(rnd.randrange(1, 80))], 0.3, rnd))
+        b = ' '.join(mutate(['w{}'.format(rnd.randrange(50)) for _ in range(rnd.randrange(1, 80))], 0.3, rnd))
+        diff = DiffContent(a, b, granularity)
+        assert diff.length_ratio() >= diff.quick_ratio() - 1e-12
+        assert diff.quick_ratio() >= diff.ratio() - 1e-12
+
+
+@pytest.mark.parametrize('ratio_limit', [0, 0.5, 0.9])
+def test_pruned_search_finds_same_file_as_full_search(ratio_limit):
+    rnd = random.Random(2)
+    files = {'f{}'.format(i): ' '.join('w{}'.format(rnd.randrange(200)) for _ in range(rnd.randrange(20, 120)))
+             for i in range(15)}
+    finder = BestMatchFinder(ratio_limit, 'words')
+    for i in range(10):
+        a = ' '.join(mutate(files['f{}'.format(i)].split(), 0.05 * i, rnd))
+        ratios = {file: DiffContent(a, b, 'words').ratio() for file, b in files.items()}
+        best_file = max(sorted(ratios), key=lambda file: ratios[file])
+
+        best = finder('url', a, sorted(files), files.__getitem__)
+        if ratios[best_file] <= ratio_limit:
+            assert best is None
+        else:
+            assert best[1] == best_file and best[2] == ratios[best_file]
+    assert finder.statistics['full_ratio'] < finder.statistics['candidates']
@@ -0,0 +1,122 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_connection_pool.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from time import monotonic, sleep
+
+import pytest
+
+from lib.ssl_provider import ConnectionPool
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.client_address[1]))
+        body = 'path {}'.format(self.path).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowBodyHandler(RecordingHandler):
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '1000')
+        self.end_headers()
+        for _ in range(10):
+            self.wfile.write(b'x' * 100)
+            self.wfile.flush()
+            sleep(0.1)
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(handler=RecordingHandler):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def no_proxy_env(monkeypatch):
+    for name in ('http_proxy', 'https_proxy', 'no_proxy', 'HTTP_PROXY', 'HTTPS_PROXY', 'NO_PROXY'):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+def test_keep_alive_connection_is_reused(start_server, no_proxy_env):
+    server = start_server()
+    url = 'http://127.0.0.1:{}/'.format(server.server_port)
+    pool = ConnectionPool()
+    try:
+        for page in range(3):
+            with pool.urlopen('{}?page={}'.format(url, page)) as resp:
+                assert resp.read() == 'path /?page={}'.format(page).encode('utf8')
+    finally:
+        pool.close()
+    assert len({port for _, port in server.requests}) == 1
+
+
+def test_proxied_url_goes_through_urllib(start_server, no_proxy_env):
+    site, proxy = (start_server(), start_server())
+    url = 'http://127.0.0.1:{}/?page=2'.format(site.server_port)
+    no_proxy_env.setenv('http_proxy', 'http://127.0.0.1:{}'.format(proxy.server_port))
+    pool = ConnectionPool()
+    try:
+        with pool.urlopen(url, timeout=5) as resp:
+            assert resp.read() == 'path {}'.format(url).encode('utf8')
+    finally:
+        pool.close()
+    assert site.requests == [] and [path for path, _ in proxy.requests] == [url]
+
+
+def test_no_proxy_host_uses_pool(start_server, no_proxy_env):
+    site = start_server()
+    no_proxy_env.setenv('http_proxy', 'http://127.0.0.1:9')
+    no_proxy_env.setenv('no_proxy', '127.0.0.1')
+    pool = ConnectionPool()
+    try:
+        with pool.urlopen('http://127.0.0.1:{}/'.format(site.server_port), timeout=5) as resp:
+            assert resp.read() == b'path /'
+    finally:
+        pool.close()
+    assert len(site.requests) == 1
+
+
+def test_deadline_covers_reading_of_body(start_server, no_proxy_env):
+    server = start_server(SlowBodyHandler)
+    pool = ConnectionPool()
+    start = monotonic()
+    try:
+        resp = pool.urlopen('http://127.0.0.1:{}/'.format(server.server_port), timeout=5, read_timeout=5,
+                            deadline=start + 0.35)
+        with pytest.raises(TimeoutError):
+            while resp.read(100):
+                pass
+        resp.close()
+    finally:
+        pool.close()
+    # each read takes 0.1 sec, so without deadline whole body is read in 1 sec
+    assert monotonic() - start < 0.7
@@ -0,0 +1,107 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_content_cache.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import os
+import sqlite3
+
+from lib.content_cache import ContentCache
+
+
+class CountingLoader:
+
+    def __init__(self) -> None:
+        self.loaded = []
+
+    def __call__(self, file):
+        self.loaded.append(os.path.basename(file))
+        with open(file, mode='r', encoding='utf8') as fd:
+            return fd.read().upper()
+
+
+def make_files(tmp_path, count):
+    files = []
+    for i in range(count):
+        file = tmp_path / 'f{}.html'.format(i)
+        file.write_text('text {}'.format(i))
+        files.append(str(file))
+    return files
+
+
+def test_least_recently_used_item_is_evicted(tmp_path):
+    f0, f1, f2 = make_files(tmp_path, 3)
+    loader, cache = (CountingLoader(), ContentCache(2))
+    assert cache.get(f0, loader) == 'TEXT 0'
+    cache.get(f1, loader)
+    cache.get(f0, loader)
+    cache.get(f2, loader)
+    cache.get(f0, loader)
+    cache.get(f1, loader)
+    assert loader.loaded == ['f0.html', 'f1.html', 'f2.html', 'f1.html']
+    assert cache.info() == (2, 0, 4, 2, 2)
+
+
+def test_unbounded_by_default(tmp_path):
+    files = make_files(tmp_path, 300)
+    loader, cache = (CountingLoader(), ContentCache())
+    for _ in range(3):
+        for file in files:
+            cache.get(file, loader)
+    assert len(loader.loaded) == 300 and cache.info().currsize == 300
+
+
+def test_changed_file_or_version_is_loaded_again(tmp_path):
+    file, = make_files(tmp_path, 1)
+    loader, cache = (CountingLoader(), ContentCache())
+    cache.get(file, loader)
+
+    with open(file, mode='a', encoding='utf8') as fd:
+        fd.write(' more')
+    assert cache.get(file, loader) == 'TEXT 0 MORE'
+
+    # same size, other mtime
+    stat = os.stat(file)
+    with open(file, mode='w', encoding='utf8') as fd:
+        fd.write('TeXt 0 mOrE')
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    cache.get(file, loader)
+
+    cache.get(file, loader, version='other')
+    cache.get(file, loader, version='other')
+    assert loader.loaded == ['f0.html'] * 4
+
+
+def test_sqlite_round_trip(tmp_path):
+    files = make_files(tmp_path, 3)
+    db_file = str(tmp_path / 'content.sqlite')
+    cache = ContentCache(file=db_file)
+    for file in files:
+        cache.get(file, CountingLoader(), version='v1')
+    cache.close()
+
+    loader, cache = (CountingLoader(), ContentCache(file=db_file))
+    try:
+        assert [cache.get(file, loader, version='v1') for file in files] == ['TEXT 0', 'TEXT 1', 'TEXT 2']
+        assert loader.loaded == [] and cache.info().disk_hits == 3
+        cache.get(files[0], loader, version='v2')
+        assert loader.loaded == ['f0.html']
+    finally:
+        cache.close()
+
+
+def test_database_of_previous_format_is_replaced(tmp_path):
+    file, = make_files(tmp_path, 1)
+    db_file = str(tmp_path / 'content.sqlite')
+    db = sqlite3.connect(db_file)
+    db.execute('CREATE TABLE content (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, content TEXT)')
+    db.commit()
+    db.close()
+
+    loader, cache = (CountingLoader(), ContentCache(file=db_file))
+    try:
+        assert cache.get(file, loader) == 'TEXT 0' and loader.loaded == ['f0.html']
+    finally:
+        cache.close()
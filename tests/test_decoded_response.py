@@ -0,0 +1,61 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_decoded_response.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import gzip
+import io
+import zlib
+
+import lxml.html
+import pytest
+
+from lib.ssl_provider import DecodedResponse, TransferStatistics
+
+BODY = ''.join('<p class="post">paragraph {}</p>'.format(i) for i in range(2000)).encode('utf8')
+
+
+class WireResponse:
+    """
+        Only read(...) and geturl() of HTTPResponse
+    """
+
+    def __init__(self, data) -> None:
+        self.fp = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.fp.read(size)
+
+    def geturl(self):
+        return 'http://blog.lan/entry/9/'
+
+
+def raw_deflate(data):
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+@pytest.mark.parametrize('encoding, compress', [
+    ('gzip', gzip.compress),
+    ('deflate', zlib.compress),
+    ('deflate', raw_deflate),
+])
+def test_body_is_decoded_by_chunks(encoding, compress):
+    wire = compress(BODY)
+    statistics = TransferStatistics()
+    resp = DecodedResponse(WireResponse(wire), encoding, statistics)
+    resp.chunk_size = 256
+    chunks = iter(lambda: resp.read(1000), b'')
+    assert max(len(chunk) for chunk in chunks) <= 1000
+    assert statistics.info() == (1, len(wire), len(BODY))
+
+    resp = DecodedResponse(WireResponse(wire), encoding, TransferStatistics())
+    assert resp.read() == BODY
+
+
+def test_lxml_parses_decoded_stream():
+    resp = DecodedResponse(WireResponse(gzip.compress(BODY)), 'gzip', TransferStatistics())
+    root = lxml.html.parse(resp).getroot()
+    assert len(root.cssselect('p.post')) == 2000 and root.base_url == 'http://blog.lan/entry/9/'
@@ -0,0 +1,68 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_frontier.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import random
+
+import pytest
+
+from lib.frontier import CrawlFrontier
+
+
+def drain(frontier):
+    return [frontier.pop() for _ in range(len(frontier))]
+
+
+@pytest.mark.parametrize('memory_limit', [2, 3, 100])
+def test_fifo_order_is_kept_when_urls_are_spilled(tmp_path, memory_limit):
+    frontier = CrawlFrontier(memory_limit=memory_limit, spill_file=str(tmp_path / 'frontier.sqlite'))
+    urls = ['/?page={}'.format(i) for i in range(50)]
+    try:
+        assert frontier.push(urls[0]) and not frontier.push(urls[0])
+        frontier.extend(urls + urls[:10])
+        assert len(frontier) == 50 and '/?page=49' in frontier
+        assert frontier.peek(3) == urls[:3]
+        popped = [frontier.pop() for _ in range(20)]
+        # urls pushed during popping go after the rest
+        frontier.extend(['/new/1', '/?page=0', '/new/2'])
+        assert popped + drain(frontier) == urls + ['/new/1', '/new/2']
+        assert not frontier and '/?page=0' in frontier
+        with pytest.raises(IndexError):
+            frontier.pop()
+    finally:
+        frontier.close()
+
+
+@pytest.mark.parametrize('memory_limit', [2, 5, 1000])
+def test_priority_order_is_kept_when_urls_are_spilled(memory_limit):
+    rnd = random.Random(7)
+    priorities = {'/{}'.format(i): rnd.randint(0, 9) for i in range(200)}
+    urls = list(priorities)
+
+    def order(url):
+        # same priorities - in order of pushing
+        return priorities[url], urls.index(url)
+
+    frontier = CrawlFrontier(priority=priorities.get, memory_limit=memory_limit)
+    try:
+        frontier.extend(urls[:150])
+        popped = [frontier.pop() for _ in range(50)]
+        frontier.extend(urls[150:])
+        assert frontier.peek(5) == sorted(set(urls) - set(popped), key=order)[:5]
+        popped += drain(frontier)
+    finally:
+        frontier.close()
+
+    assert popped[:50] == sorted(urls[:150], key=order)[:50]
+    assert popped[50:] == sorted(popped[50:], key=order)
+    assert sorted(popped) == sorted(urls)
+
+
+def test_seen_container_is_used_for_membership():
+    seen = {'/old'}
+    frontier = CrawlFrontier(['/old', '/new'], seen=seen)
+    assert drain(frontier) == ['/new'] and seen == {'/old', '/new'}
+    frontier.close()
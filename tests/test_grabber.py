@@ -0,0 +1,205 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_grabber.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import io
+
+import lxml.html
+import pytest
+from lxml.etree import XPath
+
+import lib.grabber
+from lib.grabber import ContentSelector, LinksGrabber, MultiSelector, css_to_self_test
+
+DOCUMENT = lxml.html.fromstring('''
+<html><body>
+  <div class="a" id="d1">
+    <h1 id="h1">title</h1>
+    <p id="p1" class="x">one</p>
+    <p id="p2">two <span id="s1">s</span></p>
+    <div id="d2"><p id="p3">three</p><span id="s2">s</span></div>
+  </div>
+  <p id="p4">four</p>
+  <ul><li id="l1"><a id="a1" class="btn">1</a></li><li id="l2"><a id="a2">2</a></li></ul>
+</body></html>
+''')
+
+
+@pytest.mark.parametrize('css', [
+    'p', 'div.a > p', 'div.a p', 'body > div p', 'h1 + p', 'h1 ~ p', 'p:nth-child(2)', 'p:not(.x)',
+    'div.a span, ul a.btn', 'li:first-child > a', 'div > div > span', '#d1 > :not(h1)',
+])
+def test_css_to_self_test_matches_cssselect(css):
+    is_matched = XPath(css_to_self_test(css))
+    found = [el.get('id') for el in DOCUMENT.iter() if is_matched(el)]
+    assert found == [el.get('id') for el in DOCUMENT.cssselect(css)]
+
+
+def test_css_to_self_test_rejects_pseudo_elements():
+    with pytest.raises(ValueError):
+        css_to_self_test('p::first-line')
+
+
+def test_compiled_selector_is_shared_and_finds_same_elements():
+    xpath = ContentSelector.compile_selector('div.a p')
+    assert xpath is ContentSelector.compile_selector('div.a p')
+    assert xpath is not ContentSelector.compile_selector('div.a p', True)
+    assert xpath(DOCUMENT) == DOCUMENT.cssselect('div.a p')
+    provider = ContentSelector(DOCUMENT, 'div.a p')
+    assert list(provider) == DOCUMENT.cssselect('div.a p')
+
+
+class Stream(io.BytesIO):
+
+    closed_at = None
+
+    def close(self):
+        if not self.closed:
+            self.closed_at = self.tell()
+        super().close()
+
+
+class IncrementalSelector(ContentSelector):
+    selector = 'p'
+
+    incremental_container = 'div.body_content'
+
+    incremental_chunk_size = 64
+
+    incremental_drain_size = 1024
+
+
+def make_page(tail_size):
+    return '<html><body><div class="body_content"><p>text</p></div><footer>{}</footer></body></html>'.format(
+        'x' * tail_size
+    ).encode('utf8')
+
+
+def test_incremental_parsing_drains_small_rest():
+    page = make_page(500)
+    stream = Stream(page)
+    texts = [el.text for el in IncrementalSelector(stream)]
+    assert texts == ['text'] and stream.closed_at is None and stream.tell() == len(page)
+
+
+def test_incremental_parsing_closes_stream_with_big_rest():
+    page = make_page(100000)
+    stream = Stream(page)
+    texts = [el.text for el in IncrementalSelector(stream)]
+    assert texts == ['text'] and stream.closed_at is not None and stream.closed_at < len(page) // 10
+
+
+def test_incremental_parsing_reads_to_end_if_stream_asks():
+    page = make_page(100000)
+    stream = Stream(page)
+    stream.read_to_end = True
+    assert [el.text for el in IncrementalSelector(stream)] == ['text']
+    assert stream.closed_at is None and stream.tell() == len(page)
+
+
+def test_incremental_parsing_without_container_parses_whole_page():
+    page = b'<html><body><p>one</p><p>two</p></body></html>'
+    stream = Stream(page)
+    assert [el.text for el in IncrementalSelector(stream)] == ['one', 'two']
+    assert stream.closed_at is None
+
+
+class PageStream(Stream):
+
+    status = 200
+
+    def __init__(self, data, url) -> None:
+        super().__init__(data)
+        self.url = url
+
+    def geturl(self):
+        return self.url
+
+
+class FakeGetResponse:
+
+    pages = {}
+
+    def __init__(self, url) -> None:
+        self.url = url.full_url
+
+    def process(self):
+        return PageStream(self.pages[self.url], self.url)
+
+
+def test_prefetched_page_is_parsed_with_settings_of_link_provider(monkeypatch):
+    monkeypatch.setattr(lib.grabber, 'GetResponse', FakeGetResponse)
+    FakeGetResponse.pages = {
+        'http://blog.lan/?page=2': b'<html><body><div class="body_content"><a href="/2">2</a></div>'
+                                   b'<p>' + b'x' * 1000 + b'</p><a class="late" href="/late">late</a></body></html>'
+    }
+    provider = ContentSelector(selector='a')
+    provider.incremental_container = 'div.body_content'
+    provider.incremental_chunk_size = 64
+    provider.incremental_drain_size = 0
+    provider.content = lxml.html.fromstring('<html><body><a href="/1">1</a></body></html>')
+    grabber = LinksGrabber('http://blog.lan/', link_provider=provider)
+
+    content = grabber._prefetch_page_content('http://blog.lan/?page=2')
+    assert [el.get('href') for el in content.cssselect('a')] == ['/2']
+    # link_provider of the main thread keeps its page
+    assert [el.get('href') for el in provider] == ['/1']
+
+
+def test_multi_selector_groups_are_same_as_cssselect():
+    selectors = {'links': 'div.a p, ul a.btn', 'spans': 'span', 'first': 'li:first-child > a'}
+    extractor = MultiSelector.get(selectors)
+    assert extractor is MultiSelector.get(dict(reversed(list(selectors.items()))))
+    groups = extractor(DOCUMENT)
+    assert groups == {name: DOCUMENT.cssselect(selector) for name, selector in selectors.items()}
+
+
+def make_site(pages=4, per_page=3):
+    site = {}
+    for page in range(1, pages + 1):
+        links = ''.join('<a class="btn" href="/entry/{}/">post</a>'.format((page - 1) * per_page + i)
+                        for i in range(per_page))
+        pager = ''.join('<a class="page-link" href="/?page={}">{}</a>'.format(i, i) for i in range(1, pages + 1))
+        body = '<div class="body_content">{}<nav>{}</nav></div>'.format(links, pager)
+        site['http://blog.lan/?page={}'.format(page)] = '<html><body>{}</body></html>'.format(body).encode('utf8')
+    return site
+
+
+class NoMultiSelectorGrabber(LinksGrabber):
+
+    def _extract(self, content, *args):
+        return None
+
+
+@pytest.mark.parametrize('lookahead', [0, 2])
+def test_single_pass_grabber_finds_same_links(monkeypatch, lookahead):
+    monkeypatch.setattr(lib.grabber, 'GetResponse', FakeGetResponse)
+    FakeGetResponse.pages = make_site()
+    results = []
+    for grabber_class in (LinksGrabber, NoMultiSelectorGrabber):
+        grabber = grabber_class('http://blog.lan/?page=1', ContentSelector(selector='div.body_content > a.btn'),
+                                ContentSelector(selector='nav a.page-link'))
+        grabber.lookahead = lookahead
+        results.append([(url, grabber.current_start_url) for url in grabber])
+    assert results[0] == results[1]
+    assert [url for url, _ in results[0]] == ['http://blog.lan/entry/{}/'.format(i) for i in range(12)]
+
+
+def test_attribute_mode_finds_same_links_and_selects_pager_only(monkeypatch):
+    monkeypatch.setattr(lib.grabber, 'GetResponse', FakeGetResponse)
+    FakeGetResponse.pages = make_site()
+    groups = []
+    get = MultiSelector.get
+    monkeypatch.setattr(MultiSelector, 'get', lambda selectors: groups.append(sorted(selectors)) or get(selectors))
+    results = []
+    for attribute_mode in (True, False):
+        grabber = LinksGrabber('http://blog.lan/?page=1', ContentSelector(selector='div.body_content > a.btn'),
+                               ContentSelector(selector='nav a.page-link'))
+        grabber.attribute_mode = attribute_mode
+        results.append([(url, grabber.current_start_url) for url in grabber])
+        if attribute_mode:
+            assert groups and all(names == ['page'] for names in groups)
+    assert results[0] == results[1] and len(results[0]) == 12
@@ -0,0 +1,52 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_html_tools.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import pytest
+
+from lib.html_tools import DiffContent
+
+
+def test_unknown_granularity():
+    with pytest.raises(ValueError):
+        DiffContent('a', 'b', 'lines')
+
+
+def test_tokens():
+    diff = DiffContent('One  two. Three four!  Five', 'x', 'sentences')
+    assert diff.tokens == (['One two.', 'Three four!', 'Five'], ['x'])
+    assert DiffContent(' a   b ', 'c d', 'words').tokens == (['a', 'b'], ['c', 'd'])
+    assert DiffContent('ab', 'cd').tokens == ('ab', 'cd')
+
+
+@pytest.mark.parametrize('granularity', ['chars', 'words', 'sentences'])
+def test_diff_indexes_are_char_offsets(granularity):
+    a = 'The quick brown fox. It jumps over the lazy dog. The end.'
+    b = 'The quick red fox. It jumps over the lazy dog again. The end. Appendix.'
+    diff = DiffContent(a, b, granularity)
+    result = diff.compare()
+    assert result
+    for res in result:
+        # differences are stripped (ignore_empty_differences), index is start of not stripped one
+        if res.a_diff:
+            assert diff.a[res.a_index:].lstrip().startswith(res.a_diff)
+        if res.b_diff:
+            assert diff.b[res.b_index:].lstrip().startswith(res.b_diff)
+
+
+def test_word_diff_positions():
+    diff = DiffContent('alpha beta gamma', 'alpha delta gamma epsilon', 'words')
+    result = diff.compare()
+    assert [(res.tag, res.a_index, res.a_diff, res.b_index, res.b_diff) for res in result] == [
+        ('replace', 6, 'beta', 6, 'delta'),
+        ('insert', 16, '', 18, 'epsilon'),
+    ]
+    assert diff.ratio() == pytest.approx(2 * 2 / 7)
+
+
+def test_equal_texts():
+    assert DiffContent('a  b c', 'a b   c', 'words').is_equal()
+    assert DiffContent('a b c', 'a b c').ratio() == 1.0
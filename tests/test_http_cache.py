@@ -0,0 +1,57 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_http_cache.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import io
+from email.message import Message
+
+from lib.http_cache import HttpCache, CachedResponse
+
+URL = 'http://blog.lan/entry/9/?text=1'
+
+
+class FakeResponse(io.BytesIO):
+
+    def __init__(self, body, status=200, headers=None) -> None:
+        super().__init__(body)
+        self.status = status
+        self.reason = 'OK'
+        self.headers = Message()
+        for name, value in (headers or {}).items():
+            self.headers[name] = value
+
+    def geturl(self):
+        return URL
+
+
+def test_body_read_to_end_is_served_after_not_modified(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    assert cache.get(URL) is None
+    resp = cache.store(URL, FakeResponse(b'<p>post</p>', headers={'ETag': '"v1"'}))
+    assert resp.read(3) == b'<p>' and cache.get(URL) is None
+    assert resp.read() == b'post</p>'
+    resp.close()
+
+    entry = cache.get(URL)
+    req = cache.conditional_request(URL, entry)
+    assert req.get_header('If-none-match') == '"v1"'
+    cached = cache.response(entry)
+    assert isinstance(cached, CachedResponse)
+    assert cached.read() == b'<p>post</p>' and cached.status == 200 and cached.geturl() == URL
+    assert cached.getheader('ETag') == '"v1"'
+    assert cache.info() == (1, 1, 1)
+
+
+def test_responses_that_cannot_be_validated_or_closed_early_are_not_stored(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    resp = FakeResponse(b'body')
+    assert cache.store(URL, resp) is resp
+
+    resp = cache.store(URL, FakeResponse(b'body', headers={'Last-Modified': 'Sat, 01 Jan 2022 00:00:00 GMT'}))
+    resp.read(2)
+    resp.close()
+    assert cache.get(URL) is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,41 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_link_cache.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+from lib.link_cache import LRUDict, LinkCheckCache
+
+
+def test_lru_dict_evicts_least_recently_used():
+    lru = LRUDict(2)
+    lru['a'], lru['b'] = (1, 2)
+    assert lru['a'] == 1
+    lru['c'] = 3
+    assert dict(lru) == {'a': 1, 'c': 3}
+    lru['a'] = 4
+    lru['d'] = 5
+    assert list(lru) == ['a', 'd'] and 'c' not in lru
+
+
+def test_link_check_cache_ttl_by_status_class(tmp_path):
+    file = str(tmp_path / 'links.sqlite')
+    cache = LinkCheckCache(file, {4: 100, 5: None})
+    cache.put('/ok', (200, 'OK'), now=0)
+    cache.put('/missing', (404, 'Not Found'), now=0)
+    cache.put('/failed', (500, 'Server Error'), now=0)
+    cache.put('/no-response', (0, 'timed out'), now=0)
+    cache.close()
+
+    # results are committed on close and read by another run
+    cache = LinkCheckCache(file, {4: 100, 5: None})
+    try:
+        assert cache.get('/ok', now=100) == (200, 'OK')
+        assert cache.get('/missing', now=100) == (404, 'Not Found')
+        assert cache.get('/missing', now=101) is None
+        assert cache.get('/failed', now=0) is None
+        assert cache.get('/no-response', now=cache.ttl[0] + 1) is None
+        assert cache.get('/unknown', now=0) is None
+    finally:
+        cache.close()
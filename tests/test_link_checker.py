@@ -0,0 +1,135 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_link_checker.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import socket
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from time import sleep
+
+import pytest
+
+from lib.link_checker import LinkCheckerBase, LoggedLinkCheckerBase
+from lib.ssl_provider import GetResponse
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    statuses = {'/missing': 404, '/failed': 500}
+
+    def do_HEAD(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            sleep(0.05)
+            self.send_response(self.statuses.get(self.path, 200))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowHeadersHandler(CountingHandler):
+
+    def do_HEAD(self):
+        sleep(1)
+        super().do_HEAD()
+
+
+@pytest.fixture
+def start_server(monkeypatch):
+    for name in ('http_proxy', 'https_proxy', 'no_proxy', 'HTTP_PROXY', 'HTTPS_PROXY', 'NO_PROXY'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(GetResponse, 'retries', 0)
+    servers = []
+
+    def start(handler=CountingHandler):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.lock, server.active, server.max_active = (threading.Lock(), 0, 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return 'http://127.0.0.1:{}'.format(server.server_port), server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return 'http://127.0.0.1:{}/'.format(sock.getsockname()[1])
+
+
+def run_checker(links, concurrency, capsys):
+    checker = LoggedLinkCheckerBase(list(links))
+    checker.concurrency = concurrency
+    checker.check()
+    logged = [line for line in capsys.readouterr().out.splitlines() if not line.startswith('Compressed')]
+    # reading of LRUDict moves item to the end, so urls are listed before
+    results = [(url, checker.checked_urls[url]) for url in list(checker.checked_urls)]
+    return {url: (status, str(reason)) for url, (status, reason) in results}, logged
+
+
+def test_concurrent_check_is_same_as_serial(start_server, capsys):
+    (site_a, server_a), (site_b, _) = (start_server(), start_server())
+    refused_url, links = (closed_port_url(), [])
+    for i in range(10):
+        links += ['{}/?page={}'.format(site_a, i), '{}/entry/{}/'.format(site_b, i)]
+    links += ['{}/missing'.format(site_a), '{}/?page=3'.format(site_a), '{}/failed'.format(site_b),
+              refused_url, '{}/entry/0/'.format(site_b), '{}/missing'.format(site_a)]
+
+    serial = run_checker(links, 1, capsys)
+    assert server_a.max_active == 1
+    concurrent = run_checker(links, 8, capsys)
+    assert server_a.max_active > 1
+
+    assert concurrent == serial
+    checked_urls, logged = concurrent
+    assert set(checked_urls) == set(links)
+    assert checked_urls['{}/missing'.format(site_a)] == (0, 'Not Found')
+    assert checked_urls[refused_url][0] == 0
+    assert len(logged) == len(links) and logged[-1].endswith('- Checked already')
+
+
+def test_per_host_concurrency_is_enforced(start_server):
+    (site_a, server_a), (site_b, server_b) = (start_server(), start_server())
+    checker = LinkCheckerBase(['{}/?page={}'.format(site, i) for i in range(12) for site in (site_a, site_b)])
+    checker.concurrency, checker.per_host_concurrency = (8, 2)
+    checker.check()
+    assert len(checker.checked_urls) == 24
+    assert server_a.max_active == server_b.max_active == 2
+
+
+@pytest.mark.parametrize('through_proxy', [False, True])
+def test_read_timeout_of_urllib_is_failure_of_host(start_server, monkeypatch, through_proxy):
+    site, _ = start_server(SlowHeadersHandler)
+    monkeypatch.setattr(GetResponse, 'read_timeout', 0.2)
+    # urllib reads proxies of environment when its global opener is built
+    monkeypatch.setattr(urllib.request, '_opener', None)
+    url, host = ('{}/'.format(site), site[len('http://'):])
+    if through_proxy:
+        # proxied urls are requested by urllib even if the pool is used
+        monkeypatch.setenv('http_proxy', site)
+        url, host = ('http://blog.lan/', 'blog.lan')
+    else:
+        monkeypatch.setattr(GetResponse, 'connection_pool', None)
+
+    checker = LinkCheckerBase([])
+    (status, reason), resp = checker._check_url(url, None)
+    assert (status, resp) == (0, None) and isinstance(reason, TimeoutError)
+    assert checker.checked_urls[url][0] == 0
+    assert checker.circuit_breaker.failures(host) == 1
@@ -0,0 +1,83 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_minhash.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import random
+
+import pytest
+
+from lib.minhash import MinHash, MinHashLSH
+
+
+def words(n, seed):
+    rnd = random.Random(seed)
+    return ['w{}'.format(rnd.randrange(5000)) for _ in range(n)]
+
+
+def test_signature_is_deterministic_and_dense():
+    text = ' '.join(words(300, 1))
+    sig = MinHash(text).signature
+    assert sig == MinHash(text).signature
+    assert len(sig) == MinHash.num_perm
+    assert None not in sig
+
+
+def test_empty_text():
+    assert MinHash('').signature == tuple([-1] * MinHash.num_perm)
+    assert MinHash('').jaccard(MinHash('   ')) == 1.0
+
+
+def test_jaccard_estimate():
+    base = words(2000, 2)
+    same = MinHash(' '.join(base), num_perm=256)
+    assert same.jaccard(MinHash(' '.join(base), num_perm=256)) == 1.0
+
+    changed = list(base)
+    for i in range(0, len(changed), 10):
+        changed[i] = 'x{}'.format(i)
+    shingles_a, shingles_b = (same.shingles(' '.join(base)), same.shingles(' '.join(changed)))
+    exact = len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+    assert abs(same.jaccard(MinHash(' '.join(changed), num_perm=256)) - exact) < 0.1
+
+    other = MinHash(' '.join(words(2000, 3)), num_perm=256)
+    assert same.jaccard(other) < 0.05
+
+
+def test_jaccard_requires_same_num_perm():
+    with pytest.raises(ValueError):
+        MinHash('a b c', num_perm=32).jaccard(MinHash('a b c', num_perm=64))
+
+
+def test_lsh_bands_validation():
+    with pytest.raises(ValueError):
+        MinHashLSH(bands=7)
+
+
+def test_lsh_query_ranks_similar_first():
+    texts = {key: words(400, seed) for key, seed in (('a', 10), ('b', 11), ('c', 12))}
+    index = MinHashLSH(bands=32)
+    for key, text in texts.items():
+        index.add(key, ' '.join(text))
+
+    query = list(texts['b'])
+    query[5] = 'changed'
+    assert index.query(' '.join(query), 1) == ['b']
+    # exhaustive fallback fills up to limit even without a common band
+    assert sorted(index.query(' '.join(query), 3)) == ['a', 'b', 'c']
+    assert index.query(' '.join(query)) == ['b']
+
+
+def test_lsh_remove_and_replace():
+    index = MinHashLSH(bands=16)
+    index.add('a', ' '.join(words(300, 20)))
+    index.add('b', ' '.join(words(300, 21)))
+    index.remove('a')
+    assert 'a' not in index and len(index) == 1
+    assert index.query(' '.join(words(300, 20))) == []
+
+    index.add('b', ' '.join(words(300, 20)))
+    assert len(index) == 1
+    assert index.query(' '.join(words(300, 20))) == ['b']
@@ -0,0 +1,254 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_post_text_compare.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import json
+import threading
+
+import pytest
+
+from lib.html_tools import NormalizeContent
+from lib.post_text_compare import PostTextsComparer
+
+
+class FakeFetchComparer(PostTextsComparer):
+
+    fetch_workers = 2
+
+    fetch_lookahead = 3
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.fetched = []
+        self.lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _get_url_content(self, url, timeout=None):
+        with self.lock:
+            self.fetched.append(url)
+        return 'text of ' + url
+
+
+def test_prefetch_is_bounded_and_forgets_taken_texts(tmp_path):
+    comparer = FakeFetchComparer('http://blog.lan/', str(tmp_path), str(tmp_path / 'relations.txt'))
+    urls = ['u{}'.format(i) for i in range(20)]
+    comparer._prefetch_url_contents(urls)
+    in_flight = comparer._PostTextsComparer__url_contents
+    try:
+        for url in urls:
+            assert len(in_flight) <= comparer.fetch_lookahead
+            assert comparer._get_prefetched_url_content(url) == 'text of ' + url
+            assert url not in in_flight
+    finally:
+        comparer._stop_prefetch()
+    assert sorted(comparer.fetched) == sorted(urls)
+
+
+def test_prefetch_keep_and_out_of_order(tmp_path):
+    comparer = FakeFetchComparer('http://blog.lan/', str(tmp_path), str(tmp_path / 'relations.txt'))
+    urls = ['u{}'.format(i) for i in range(10)]
+    comparer._prefetch_url_contents(urls)
+    try:
+        assert comparer._get_prefetched_url_content('u0', keep=True) == 'text of u0'
+        assert comparer._get_prefetched_url_content('u0') == 'text of u0'
+        # taken before its turn, it is not fetched again later
+        assert comparer._get_prefetched_url_content('u8') == 'text of u8'
+        for url in urls[1:]:
+            if url != 'u8':
+                comparer._get_prefetched_url_content(url)
+    finally:
+        comparer._stop_prefetch()
+    assert sorted(comparer.fetched) == sorted(urls)
+
+
+class FakeSiteComparer(PostTextsComparer):
+
+    fetch_workers = 1
+
+    diff_granularity = 'words'
+
+    posts = {}
+
+    def urls(self):
+        return set(self.posts)
+
+    def _get_url_content(self, url, timeout=None):
+        return self.posts[url]
+
+
+def make_site(tmp_path, count=4):
+    posts = {}
+    for i in range(count):
+        text = ' '.join('w{}'.format((i * 37 + j * 11) % 300) for j in range(200))
+        (tmp_path / 'f{}.html'.format(i)).write_text('<html><body><div><p>{}</p></div></body></html>'.format(text))
+        posts['http://blog.lan/entry/{}/'.format(i)] = text.replace('w11 ', 'w12 ')
+    return posts
+
+
+def test_stored_results_are_reused_only_with_same_params(tmp_path, monkeypatch):
+    FakeSiteComparer.posts = make_site(tmp_path)
+    relations_file = str(tmp_path / 'relations.txt')
+    calls = []
+    compare = FakeSiteComparer.best_match_finder_class.compare
+    monkeypatch.setattr(FakeSiteComparer.best_match_finder_class, 'compare',
+                        lambda self, *args: calls.append(self.granularity) or compare(self, *args))
+
+    comparer = FakeSiteComparer('', str(tmp_path), relations_file).compare()
+    comparer.dump_relations()
+    assert len([rel for rel in comparer.relations if rel.url and rel.file]) == 4
+    assert len({rel.params_md5 for rel in comparer.relations}) == 1
+
+    FakeSiteComparer('', str(tmp_path), relations_file).compare()
+    assert calls == []
+
+    changed = FakeSiteComparer('', str(tmp_path), relations_file)
+    changed.diff_granularity = 'chars'
+    changed.compare()
+    assert calls == ['chars'] * 4
+    assert {rel.params_md5 for rel in changed.relations} == {changed._get_params_md5()}
+    assert changed._get_params_md5() != comparer._get_params_md5()
+
+
+def spy_finder(monkeypatch):
+    calls = []
+    compare = FakeSiteComparer.best_match_finder_class.compare
+    monkeypatch.setattr(FakeSiteComparer.best_match_finder_class, 'compare',
+                        lambda self, url, *args: calls.append(url) or compare(self, url, *args))
+    return calls
+
+
+@pytest.mark.parametrize('fields', [4, 6])
+def test_old_records_without_params_are_compared_again(tmp_path, monkeypatch, fields):
+    FakeSiteComparer.posts = make_site(tmp_path)
+    relations_file = str(tmp_path / 'relations.txt')
+    FakeSiteComparer('', str(tmp_path), relations_file).compare().dump_relations()
+    # records of previous versions: (url, file, ratio, diff) and then with url_md5, file_md5
+    with open(relations_file, mode='r') as fd:
+        records = [item[:fields] for item in json.load(fd)]
+    with open(relations_file, mode='w') as fd:
+        json.dump(records, fd)
+
+    calls = spy_finder(monkeypatch)
+    comparer = FakeSiteComparer('', str(tmp_path), relations_file)
+    assert {rel.params_md5 for rel in comparer.relations} == {''}
+    comparer.compare()
+    assert sorted(calls) == sorted(FakeSiteComparer.posts)
+    assert {rel.params_md5 for rel in comparer.relations} == {comparer._get_params_md5()}
+    assert sorted(rel[:2] for rel in comparer.relations) == sorted(tuple(rel[:2]) for rel in records)
+
+
+def test_records_with_same_params_are_not_compared_again(tmp_path, monkeypatch):
+    FakeSiteComparer.posts = make_site(tmp_path)
+    relations_file = str(tmp_path / 'relations.txt')
+    FakeSiteComparer('', str(tmp_path), relations_file).compare().dump_relations()
+    calls = spy_finder(monkeypatch)
+
+    comparer = FakeSiteComparer('', str(tmp_path), relations_file)
+    params_md5 = comparer._get_params_md5()
+    assert {rel.params_md5 for rel in comparer.relations} == {params_md5}
+    comparer.compare()
+    assert calls == []
+    assert {rel.params_md5 for rel in comparer.relations} == {params_md5}
+
+
+class CrashingComparer(FakeSiteComparer):
+
+    crash_after = None
+
+    fetched = []
+
+    def _get_url_content(self, url, timeout=None):
+        if self.crash_after is not None and len(self.fetched) >= self.crash_after:
+            raise RuntimeError('crash')
+        self.fetched.append(url)
+        return super()._get_url_content(url, timeout)
+
+
+def test_jsonl_journal_resume(tmp_path):
+    CrashingComparer.posts = make_site(tmp_path, 6)
+    relations_file = str(tmp_path / 'relations.jsonl')
+
+    comparer = CrashingComparer('', str(tmp_path), relations_file)
+    comparer.crash_after, CrashingComparer.fetched = (3, [])
+    with pytest.raises(RuntimeError):
+        comparer.compare()
+    journal = tmp_path / 'relations.jsonl.part'
+    assert len(journal.read_text().splitlines()) == 3
+    assert not (tmp_path / 'relations.jsonl').exists()
+
+    # last line was written partially
+    with journal.open('a') as fd:
+        fd.write('["http://blog.lan/entry/5/", "/f')
+
+    CrashingComparer.fetched = []
+    comparer = CrashingComparer('', str(tmp_path), relations_file).compare()
+    comparer.dump_relations()
+    assert len(CrashingComparer.fetched) == 3
+    assert not journal.exists()
+
+    relations = list(CrashingComparer('', str(tmp_path), relations_file).iter_relations())
+    assert len(relations) == 6
+    assert sorted(rel.url for rel in relations) == sorted(CrashingComparer.posts)
+    assert all(rel.file for rel in relations)
+
+
+def test_files_are_parsed_once_and_again_when_normalization_changes(tmp_path, monkeypatch):
+    posts = make_site(tmp_path, 300)
+    FakeSiteComparer.posts = {url: posts[url] for url in sorted(posts)[:20]}
+    parsed = []
+    read = FakeSiteComparer._read_file_content
+
+    def counting_read(file):
+        parsed.append(file)
+        return read(file)
+
+    monkeypatch.setattr(FakeSiteComparer, '_read_file_content', staticmethod(counting_read))
+
+    comparer = FakeSiteComparer('', str(tmp_path), str(tmp_path / 'relations.txt')).compare()
+    assert len(parsed) == len(set(parsed)) == 300
+    assert comparer.file_content_cache.info().misses == 300
+
+    parsed.clear()
+    monkeypatch.setattr(NormalizeContent, 'block_tag_prefix', ' ')
+    comparer.compare()
+    assert len(parsed) == 300
+
+
+class ParallelComparer(FakeSiteComparer):
+
+    fetch_lookahead = 3
+
+    fetched = []
+
+    def _get_url_content(self, url, timeout=None):
+        self.fetched.append(url)
+        return super()._get_url_content(url, timeout)
+
+    def _write_relations_journal(self, item):
+        # number of fetched posts when each relation is decided
+        self.journaled.append(len(self.fetched))
+        super()._write_relations_journal(item)
+
+
+@pytest.mark.parametrize('candidates_limit', [None, 3])
+def test_parallel_comparison_is_same_as_serial(tmp_path, candidates_limit):
+    posts = make_site(tmp_path, 10)
+    # duplicates take files of the originals, so the originals have to be searched again
+    posts.update({'http://blog.lan/dup/{}/'.format(i): posts['http://blog.lan/entry/{}/'.format(i)] for i in range(3)})
+    ParallelComparer.posts = posts
+
+    results = []
+    for jobs in (1, 2):
+        comparer = ParallelComparer('', str(tmp_path), str(tmp_path / 'relations{}.jsonl'.format(jobs)))
+        comparer.jobs, comparer.candidates_limit = (jobs, candidates_limit)
+        comparer.fetched, comparer.journaled = ([], [])
+        comparer.compare()
+        results.append([tuple(rel) for rel in comparer.relations])
+        if jobs > 1:
+            # relations are journaled while next posts are fetched, not after all of them
+            assert comparer.journaled[0] <= comparer.fetch_lookahead + 1
+            assert len(comparer.fetched) == len(posts)
+    assert results[0] == results[1]
+    assert len([rel for rel in results[0] if rel[0] and rel[1]]) == 10
@@ -0,0 +1,115 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_scheduler.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import threading
+from time import monotonic
+
+import pytest
+
+import lib.scheduler
+from lib.scheduler import HostScheduler, CircuitBreaker
+
+
+def test_requests_of_host_are_spaced_by_rate():
+    scheduler = HostScheduler(rate=20, concurrency=4)
+    start = monotonic()
+    for _ in range(3):
+        scheduler.acquire('blog.lan')
+    assert monotonic() - start >= 2 / 20 - 0.01
+    # other hosts are not delayed
+    assert scheduler.acquire('other.lan') < 0.01
+    assert scheduler.info().requests == 4
+
+
+def test_concurrency_blocks_until_release():
+    scheduler = HostScheduler(rate=0, concurrency=1)
+    scheduler.acquire('blog.lan')
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (scheduler.acquire('blog.lan'), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+    scheduler.release('blog.lan', 0.01, 200)
+    assert acquired.wait(5)
+    thread.join()
+
+
+def test_throttle_status_halves_limits_and_postpones_host():
+    scheduler = HostScheduler(rate=10, concurrency=4)
+    scheduler.acquire('blog.lan')
+    scheduler.release('blog.lan', 0.01, 429, {'Retry-After': '0.2'})
+    assert scheduler.limits() == {'blog.lan': (5, 2)}
+    assert scheduler.acquire('blog.lan') >= 0.15
+    assert scheduler.info().throttled == 1
+
+
+def test_latency_adapts_rate():
+    scheduler = HostScheduler(rate=10, concurrency=2)
+    scheduler.target_latency = 0.5
+    scheduler.acquire('fast.lan')
+    scheduler.release('fast.lan', 0.1, 200)
+    scheduler.acquire('slow.lan')
+    scheduler.release('slow.lan', 2.0, 200)
+    limits = scheduler.limits()
+    assert limits['fast.lan'] == (10 + scheduler.rate_step, 3)
+    assert limits['slow.lan'] == (10 * scheduler.slowdown_factor, 2)
+
+
+def test_interrupted_wait_gives_slot_back(monkeypatch):
+    def interrupted_sleep(delay):
+        raise KeyboardInterrupt()
+
+    scheduler = HostScheduler(rate=1, concurrency=1)
+    scheduler.acquire('blog.lan')
+    scheduler.release('blog.lan', 0.01, None)
+    monkeypatch.setattr(lib.scheduler, 'sleep', interrupted_sleep)
+    with pytest.raises(KeyboardInterrupt):
+        # next slot is 1 sec later, so acquire sleeps
+        scheduler.acquire('blog.lan')
+    assert scheduler.host_state('blog.lan').active == 0
+
+
+class Clock:
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_breaker_opens_and_allows_one_trial(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(lib.scheduler, 'monotonic', clock)
+    breaker = CircuitBreaker(threshold=2, reset_timeout=10)
+    breaker.record('blog.lan', True)
+    assert breaker.allow('blog.lan')
+    breaker.record('blog.lan', True)
+    assert not breaker.allow('blog.lan') and breaker.allow('other.lan')
+
+    clock.now += 10
+    assert breaker.allow('blog.lan') and not breaker.allow('blog.lan')
+    breaker.record('blog.lan', True)
+    assert not breaker.allow('blog.lan')
+
+    clock.now += 10
+    assert breaker.allow('blog.lan')
+    breaker.record('blog.lan', False)
+    assert breaker.allow('blog.lan') and breaker.failures('blog.lan') == 0
+
+
+def test_circuit_breaker_trial_expires_if_it_is_not_recorded(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(lib.scheduler, 'monotonic', clock)
+    breaker = CircuitBreaker(threshold=1, reset_timeout=10)
+    breaker.record('blog.lan', True)
+    clock.now += 10
+    assert breaker.allow('blog.lan')
+    # the trial request was interrupted, its result is never recorded
+    clock.now += 5
+    assert not breaker.allow('blog.lan')
+    clock.now += 5
+    assert breaker.allow('blog.lan')
@@ -0,0 +1,83 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_similarity.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import random
+from itertools import permutations
+
+import pytest
+
+from lib.similarity import NgramVectorizer, assign, connected_blocks, linear_sum_assignment, similarity_pairs
+
+
+def brute_force_min_cost(cost):
+    n, m = (len(cost), len(cost[0]))
+    if n <= m:
+        return min(sum(cost[i][j] for i, j in enumerate(cols)) for cols in permutations(range(m), n))
+    return min(sum(cost[i][j] for j, i in enumerate(rows)) for rows in permutations(range(n), m))
+
+
+@pytest.mark.parametrize('shape', [(1, 1), (3, 3), (4, 6), (6, 4), (5, 5)])
+def test_linear_sum_assignment_is_optimal(shape):
+    rnd = random.Random(sum(shape))
+    for _ in range(30):
+        cost = [[rnd.choice((rnd.random(), rnd.randrange(3))) for _ in range(shape[1])] for _ in range(shape[0])]
+        pairs = linear_sum_assignment(cost)
+        assert len(pairs) == min(shape)
+        assert len({i for i, _ in pairs}) == len({j for _, j in pairs}) == len(pairs)
+        assert sum(cost[i][j] for i, j in pairs) == pytest.approx(brute_force_min_cost(cost))
+
+
+def test_linear_sum_assignment_empty():
+    assert linear_sum_assignment([]) == []
+    assert linear_sum_assignment([[]]) == []
+
+
+def cosine(u, v):
+    return sum(w * v.get(ngram, 0.0) for ngram, w in u.items())
+
+
+def test_similarity_pairs_is_sparse_matrix():
+    rnd = random.Random(3)
+    texts = [' '.join('w{}'.format(rnd.randrange(30)) for _ in range(40)) for _ in range(8)]
+    vectors = NgramVectorizer(max_df=1.0).fit_transform(texts)
+    rows, cols = (vectors[:4], vectors[4:])
+    pairs = similarity_pairs(rows, cols, 0.05)
+    assert pairs == {(i, j): pytest.approx(cosine(u, v)) for i, u in enumerate(rows) for j, v in enumerate(cols)
+                     if cosine(u, v) > 0.05}
+    assert similarity_pairs(rows, rows)[0, 0] == pytest.approx(1.0)
+    candidates = [[0, 2], [], [1], [0, 1, 2, 3]]
+    assert similarity_pairs(rows, cols, 0.05, candidates) == {
+        key: pytest.approx(sim) for key, sim in pairs.items() if key[1] in candidates[key[0]]
+    }
+
+
+def test_connected_blocks():
+    assert connected_blocks({(0, 0): 1, (1, 0): 1, (2, 3): 1, (1, 1): 1}) == [([0, 1], [0, 1]), ([2], [3])]
+    assert connected_blocks({}) == []
+
+
+def test_assign_is_optimal_over_similar_pairs():
+    rnd = random.Random(5)
+    base = [' '.join('w{}'.format(rnd.randrange(60)) for _ in range(30)) for _ in range(6)]
+    rows = [' '.join(w for w in text.split() if rnd.random() > 0.3) for text in base]
+    cols = [' '.join(w for w in text.split() if rnd.random() > 0.3) for text in base]
+    rnd.shuffle(cols)
+    vectors = NgramVectorizer().fit_transform([*rows, *cols])
+    pairs = similarity_pairs(vectors[:6], vectors[6:], 0.1)
+
+    best = max(sum(pairs.get((i, j), 0.0) for i, j in enumerate(perm)) for perm in permutations(range(6)))
+    result = assign(rows, cols, 0.1)
+    assert sum(sim for _, _, sim in result) == pytest.approx(best)
+    assert all(sim > 0.1 for _, _, sim in result)
+    assert len({i for i, _, _ in result}) == len({j for _, j, _ in result}) == len(result)
+
+
+def test_assign_with_candidates():
+    rows = ['alpha beta gamma delta', 'one two three four']
+    cols = ['one two three four five', 'alpha beta gamma delta epsilon']
+    assert [(i, j) for i, j, _ in assign(rows, cols)] == [(0, 1), (1, 0)]
+    assert [(i, j) for i, j, _ in assign(rows, cols, candidates=[[0], [0]])] == [(1, 0)]
@@ -0,0 +1,56 @@
+# IDE: PyCharm
+# Project: py-post-parser
+# Path: tests
+# File: test_urlcanon.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2022-01-29 (y-m-d) 10:40 PM
+
+import pytest
+
+from lib.urlcanon import UrlCanonicalizer, BloomFilter, UrlSet
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('HTTPS://Blog.lan:443/?page=1#top', 'https://blog.lan/'),
+    ('https://blog.lan', 'https://blog.lan/'),
+    ('http://blog.lan:80/a/', 'http://blog.lan/a'),
+    ('http://blog.lan:8080/a//', 'http://blog.lan:8080/a'),
+    ('https://blog.lan/entry/9/?text=1&page=2&utm_source=x', 'https://blog.lan/entry/9?page=2&text=1'),
+    ('https://blog.lan/?q=a+b&q=c&empty=', 'https://blog.lan/?empty=&q=a+b&q=c'),
+    ('http://user@[::1]:8080/a//', 'http://user@[::1]:8080/a'),
+    ('http://blog.lan:port/', 'http://blog.lan:port/'),
+    ('  https://blog.lan/  ', 'https://blog.lan/'),
+])
+def test_canonical_form(url, expected):
+    assert UrlCanonicalizer(default_params={'page': '1'})(url) == expected
+
+
+def test_kept_params_and_options():
+    canonicalizer = UrlCanonicalizer(keep_params=['q'], strip_trailing_slash=False, sort_query=False)
+    assert canonicalizer('https://blog.lan/search/?z=1&q=b&q=a') == 'https://blog.lan/search/?q=b&q=a'
+    assert canonicalizer.fingerprint('https://blog.lan/search/?q=1') \
+        == canonicalizer.fingerprint('HTTPS://BLOG.LAN/search/?q=1&z=2#x')
+    assert canonicalizer.fingerprint('https://blog.lan/search/?q=1') < 2 ** 64
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(capacity=2000, error_rate=0.01)
+    canonicalizer = UrlCanonicalizer()
+    added = [canonicalizer.fingerprint('https://blog.lan/?page={}'.format(i)) for i in range(2000)]
+    for fingerprint in added:
+        bloom.add(fingerprint)
+    assert all(fingerprint in bloom for fingerprint in added)
+    assert len(bloom) <= 2000
+    false_positives = sum(canonicalizer.fingerprint('https://blog.lan/?p={}'.format(i)) in bloom
+                          for i in range(20000))
+    assert false_positives < 20000 * 0.01 * 2
+
+
+@pytest.mark.parametrize('fingerprints', [None, BloomFilter(capacity=100, error_rate=0.001)])
+def test_url_set_compares_canonical_urls(fingerprints):
+    urls = UrlSet(UrlCanonicalizer(default_params={'page': '1'}), fingerprints)
+    urls.add('https://blog.lan/')
+    urls.add('https://blog.lan/?page=2')
+    assert 'HTTPS://blog.lan:443/?page=1' in urls and 'https://blog.lan/?page=2#top' in urls
+    assert 'https://blog.lan/?page=3' not in urls
+    assert len(urls) == 2